@@ -0,0 +1,137 @@
+"""Time the first visit to each page in a freshly started process.
+
+    python -m benchmarks.cold_start
+    python -m benchmarks.cold_start --pages streamlit_app.py --docs 100000
+
+Each page runs once in a new Python process, the way the first visitor after
+the container wakes up meets it. Streamlit itself is imported before timing
+starts, because the server has loaded it before anyone connects. Reported per
+page: time until the header is drawn (first paint), time until the script
+finishes, and which heavy libraries the page pulled in. The run fails if a page
+misses ``bootstrap.FIRST_PAINT_TARGET_MS`` or ``bootstrap.COLD_START_TARGET_MS``.
+"""
+import argparse
+import json
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import time
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGES = ('streamlit_app.py', 'pages/1_Dashboard.py', 'pages/2_Live_Violations.py', 'pages/3_Analytics.py',
+         'pages/4_Plate_Lookup.py', 'pages/5_Export.py')
+HEAVY = ('pandas', 'numpy', 'pyarrow', 'plotly', 'PIL')
+
+
+def child(page, data_path):
+    """Run ``page`` once and print its timings as JSON; runs in its own process."""
+    import streamlit.logger
+    from streamlit.testing.v1 import AppTest
+
+    streamlit.logger.set_log_level('error')
+    sys.path.insert(0, ROOT)
+
+    # The fake stands in for the Firestore client but needs its modules, so
+    # import them here and time them: the app would load them on this visit
+    started = time.perf_counter()
+    import firebase_admin
+    from firebase_admin import firestore
+    firestore_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    from firebase_admin import credentials
+    credentials_ms = (time.perf_counter() - started) * 1000
+
+    from benchmarks.fake_firestore import FakeFirestore
+
+    db = FakeFirestore()
+    with open(data_path, 'rb') as f:
+        for collection_id, documents in pickle.load(f).items():
+            db.load(collection_id, documents)
+    loaded = set(sys.modules)
+
+    # AppTest does its own setup before running the script, so note when the
+    # script itself starts executing
+    path = os.path.join(ROOT, page)
+    script_started = []
+    sys.addaudithook(lambda event, args: event == 'exec' and not script_started
+                     and getattr(args[0], 'co_filename', None) == path and script_started.append(time.perf_counter()))
+
+    app = AppTest.from_file(path, default_timeout=600)
+    app.secrets['firebase'] = {'type': 'service_account'}
+    with mock.patch.object(credentials, 'Certificate', lambda info: None), \
+            mock.patch.object(firebase_admin, 'initialize_app', lambda *a, **k: None), \
+            mock.patch.object(firestore, 'client', lambda *a, **k: db):
+        app.run()
+
+    from utils import metrics
+
+    cold = metrics.cold_start() or {}
+    # The app's clock starts when it first imports utils; count from the
+    # start of the script instead, so imports above that are included too.
+    # firestore and the credentials are imported only by get_db(), after the header
+    offset_ms = (metrics._loaded_at - script_started[0]) * 1000
+    print(json.dumps({
+        'page': page,
+        'first_paint_ms': cold.get('first_paint_ms') and round(cold['first_paint_ms'] + offset_ms, 1),
+        'total_ms': cold.get('total_ms') and round(cold['total_ms'] + offset_ms + firestore_ms + credentials_ms, 1),
+        'heavy_imports': [name for name in HEAVY if name in set(sys.modules) - loaded],
+        'errors': [str(e.value) for e in app.exception] + [str(e.value) for e in app.error],
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure first paint and cold start per page in fresh processes.')
+    parser.add_argument('--pages', nargs='+', default=PAGES)
+    parser.add_argument('--docs', type=int, default=10_000, help='synthetic violations in the fake database')
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--json', help='also write the results to this file')
+    parser.add_argument('--child', nargs=2, metavar=('PAGE', 'DATA'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(*args.child)
+        return
+
+    import streamlit.logger
+
+    # Defining cached functions outside a server logs a warning per function
+    streamlit.logger.set_log_level('error')
+    sys.path.insert(0, ROOT)
+    from benchmarks.synthetic import collections
+    from utils import bootstrap
+
+    results = []
+    failed = False
+    print(f"{'page':<28} {'first paint ms':>14} {'cold start ms':>13}  heavy imports")
+    with tempfile.TemporaryDirectory(prefix='violation-cold-') as directory:
+        data_path = os.path.join(directory, 'data.pickle')
+        with open(data_path, 'wb') as f:
+            pickle.dump(collections(args.docs, args.days), f)
+        # Keep the app's on-disk caches away from a real deployment's
+        env = dict(os.environ, TMPDIR=directory)
+        for page in args.pages:
+            output = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.cold_start', '--child', page, data_path],
+                cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            results.append(result)
+            paint_ok = result['first_paint_ms'] is not None and result['first_paint_ms'] <= bootstrap.FIRST_PAINT_TARGET_MS
+            total_ok = result['total_ms'] is not None and result['total_ms'] <= bootstrap.COLD_START_TARGET_MS
+            failed = failed or not (paint_ok and total_ok) or bool(result['errors'])
+            print(f"{page:<28} {result['first_paint_ms']:>12} {'✓' if paint_ok else '✗'} "
+                  f"{result['total_ms']:>11} {'✓' if total_ok else '✗'}  {', '.join(result['heavy_imports']) or '-'}")
+            for error in result['errors']:
+                print(f"{'':>2}error: {error}")
+    print(f"targets: first paint {bootstrap.FIRST_PAINT_TARGET_MS} ms, cold start {bootstrap.COLD_START_TARGET_MS} ms")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,588 @@
+"""In-memory stand-in for the parts of the Firestore client this app uses.
+
+Covers ``collection/document``, ``where/order_by/limit/start_after/select``,
+``stream/get``, ``count/sum/avg`` aggregations, ``set/update/delete`` with
+``merge`` and the ``Increment/Minimum/Maximum/SERVER_TIMESTAMP`` transforms,
+write batches with ``last_update_time`` preconditions, ``get_all`` and
+``on_snapshot`` listeners. Transactions are not supported.
+
+It keeps Firestore's billing model so benchmarks can report it: every query
+costs one read per returned document (at least one), and an aggregation one
+read per 1000 documents counted. ``latency`` adds a fixed delay to every
+round trip.
+"""
+import copy
+import enum
+import heapq
+import math
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from google.api_core.exceptions import FailedPrecondition, InvalidArgument, NotFound
+from google.cloud.firestore_v1 import transforms
+
+DESCENDING = 'DESCENDING'
+BATCH_LIMIT = 500
+
+_OPERATORS = {
+    '==': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+    '<': lambda a, b: a < b,
+    '<=': lambda a, b: a <= b,
+    '>': lambda a, b: a > b,
+    '>=': lambda a, b: a >= b,
+    'in': lambda a, b: a in b,
+    'not-in': lambda a, b: a not in b,
+    'array-contains': lambda a, b: isinstance(a, list) and b in a,
+    'array-contains-any': lambda a, b: isinstance(a, list) and any(item in a for item in b),
+}
+_INEQUALITIES = ('!=', '<', '<=', '>', '>=', 'not-in')
+_MISSING = object()
+
+
+def _normalize(value):
+    # The client library sends naive datetimes as UTC and returns aware ones
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    if isinstance(value, dict):
+        return {key: _normalize(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_normalize(item) for item in value]
+    return value
+
+
+def _lookup(data, path):
+    for part in path.split('.'):
+        if not isinstance(data, dict) or part not in data:
+            return _MISSING
+        data = data[part]
+    return data
+
+
+def _matches(data, field, op, value):
+    actual = _lookup(data, field)
+    if actual is _MISSING:
+        return False
+    try:
+        return _OPERATORS[op](actual, value)
+    except TypeError:
+        # Firestore never matches across value types
+        return False
+
+
+def _apply(target, data, now, merge):
+    for key, value in data.items():
+        if isinstance(value, dict) and merge:
+            nested = target.get(key)
+            if not isinstance(nested, dict):
+                nested = target[key] = {}
+            _apply(nested, value, now, merge)
+        elif isinstance(value, dict):
+            target[key] = {}
+            _apply(target[key], value, now, merge)
+        else:
+            target[key] = _resolve_transform(target.get(key), value, now)
+
+
+def _resolve_transform(current, value, now):
+    if value is transforms.SERVER_TIMESTAMP:
+        return now
+    if isinstance(value, transforms.Increment):
+        return (current if isinstance(current, (int, float)) else 0) + value.value
+    if isinstance(value, transforms.Minimum):
+        return value.value if not isinstance(current, (int, float)) else min(current, value.value)
+    if isinstance(value, transforms.Maximum):
+        return value.value if not isinstance(current, (int, float)) else max(current, value.value)
+    return _normalize(value)
+
+
+def _project(data, fields):
+    projected = {}
+    for field in fields:
+        value = _lookup(data, field)
+        if value is _MISSING:
+            continue
+        *parents, leaf = field.split('.')
+        target = projected
+        for part in parents:
+            target = target.setdefault(part, {})
+        target[leaf] = value
+    return projected
+
+
+def _copy(data):
+    return {key: copy.deepcopy(value) if isinstance(value, (dict, list)) else value for key, value in data.items()}
+
+
+class ChangeType(enum.Enum):
+    ADDED = 1
+    REMOVED = 2
+    MODIFIED = 3
+
+
+class DocumentChange:
+    def __init__(self, change_type, document):
+        self.type = change_type
+        self.document = document
+
+
+class DocumentSnapshot:
+    def __init__(self, reference, data, update_time=None, fields=None):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self.update_time = update_time
+        if data is not None and fields is not None:
+            data = _project(data, fields)
+        self._data = data
+
+    def to_dict(self):
+        return None if self._data is None else _copy(self._data)
+
+    def get(self, field_path):
+        value = _lookup(self._data or {}, field_path)
+        if value is _MISSING:
+            raise KeyError(field_path)
+        return copy.deepcopy(value)
+
+
+class AggregationResult:
+    def __init__(self, alias, value):
+        self.alias = alias
+        self.value = value
+
+
+class AggregateQuery:
+    def __init__(self, query):
+        self._query = query
+        self._aggregations = []
+
+    def _add(self, kind, field, alias):
+        self._aggregations.append((kind, field, alias or f'field_{len(self._aggregations) + 1}'))
+        return self
+
+    def count(self, alias=None):
+        return self._add('count', None, alias)
+
+    def sum(self, field_path, alias=None):
+        return self._add('sum', field_path, alias)
+
+    def avg(self, field_path, alias=None):
+        return self._add('avg', field_path, alias)
+
+    def get(self, transaction=None):
+        client = self._query._collection._client
+        client._round_trip()
+        docs = self._query._matching()
+        client._count_reads(max(1, math.ceil(len(docs) / 1000)))
+        results = []
+        for kind, field, alias in self._aggregations:
+            if kind == 'count':
+                value = len(docs)
+            else:
+                numbers = [v for v in (_lookup(data, field) for _, data in docs) if isinstance(v, (int, float))]
+                if kind == 'sum':
+                    value = sum(numbers)
+                else:
+                    value = sum(numbers) / len(numbers) if numbers else None
+            results.append(AggregationResult(alias, value))
+        return [results]
+
+
+class Query:
+    def __init__(self, collection, filters=(), orders=(), limit=None, cursor=None, fields=None):
+        self._collection = collection
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._limit = limit
+        self._cursor = cursor
+        self._fields = fields
+
+    def _copy(self, **changes):
+        state = dict(filters=self._filters, orders=self._orders, limit=self._limit,
+                     cursor=self._cursor, fields=self._fields)
+        state.update(changes)
+        return Query(self._collection, **state)
+
+    def where(self, field_path=None, op_string=None, value=None, *, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        if op_string not in _OPERATORS:
+            raise InvalidArgument(f'Unsupported operator {op_string!r}')
+        return self._copy(filters=self._filters + ((field_path, op_string, _normalize(value)),))
+
+    def order_by(self, field_path, direction='ASCENDING'):
+        return self._copy(orders=self._orders + ((field_path, direction),))
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def select(self, field_paths):
+        return self._copy(fields=tuple(field_paths))
+
+    def _cursor_values(self, values):
+        if isinstance(values, DocumentSnapshot):
+            data = dict(values._data or {}, __name__=values.id)
+            return [data.get(field) for field, _ in self._effective_orders()]
+        if isinstance(values, dict):
+            return [_normalize(values.get(field)) for field, _ in self._effective_orders()]
+        return [_normalize(value) for value in values]
+
+    def start_after(self, values):
+        return self._copy(cursor=(self._cursor_values(values), False))
+
+    def start_at(self, values):
+        return self._copy(cursor=(self._cursor_values(values), True))
+
+    def count(self, alias=None):
+        return AggregateQuery(self).count(alias)
+
+    def sum(self, field_path, alias=None):
+        return AggregateQuery(self).sum(field_path, alias)
+
+    def avg(self, field_path, alias=None):
+        return AggregateQuery(self).avg(field_path, alias)
+
+    def _effective_orders(self):
+        # Firestore orders by the inequality field first and by document name last
+        orders = list(self._orders)
+        if not orders:
+            orders = [(field, 'ASCENDING') for field, op, _ in self._filters if op in _INEQUALITIES][:1]
+        if not any(field == '__name__' for field, _ in orders):
+            orders.append(('__name__', orders[-1][1] if orders else 'ASCENDING'))
+        return orders
+
+    def _matching(self):
+        with self._collection._lock:
+            items = list(self._collection._docs.items())
+        for field, op, value in self._filters:
+            items = [(doc_id, data) for doc_id, data in items if _matches(data, field, op, value)]
+        return items
+
+    def _keyed(self, orders):
+        fields = [field for field, _ in orders if field != '__name__']
+        for doc_id, data in self._matching():
+            values = [_lookup(data, field) for field in fields]
+            # Documents without an order_by field are left out, as in Firestore
+            if _MISSING in values:
+                continue
+            values = iter(values)
+            yield [doc_id if field == '__name__' else next(values) for field, _ in orders], doc_id, data
+
+    def _ordered(self):
+        orders = self._effective_orders()
+        directions = {direction for _, direction in orders}
+        if self._limit is not None and self._cursor is None and len(directions) == 1:
+            # Top-k without sorting every match
+            pick = heapq.nlargest if DESCENDING in directions else heapq.nsmallest
+            return pick(self._limit, self._keyed(orders), key=lambda row: row[0])
+        rows = list(self._keyed(orders))
+        # One stable sort per order field, last field first
+        for position in reversed(range(len(orders))):
+            rows.sort(key=lambda row: row[0][position], reverse=orders[position][1] == DESCENDING)
+        if self._cursor is not None:
+            rows = rows[self._cursor_offset(rows, orders):]
+        if self._limit is not None:
+            rows = rows[:self._limit]
+        return rows
+
+    def _cursor_offset(self, rows, orders):
+        values, inclusive = self._cursor
+        for offset, (key, _, _) in enumerate(rows):
+            for position, value in enumerate(values):
+                if key[position] == value:
+                    continue
+                after = key[position] > value
+                if orders[position][1] == DESCENDING:
+                    after = not after
+                if after:
+                    return offset
+                break
+            else:
+                if inclusive:
+                    return offset
+        return len(rows)
+
+    def stream(self, transaction=None):
+        client = self._collection._client
+        client._round_trip()
+        rows = self._ordered()
+        client._count_reads(max(1, len(rows)))
+        for _, doc_id, data in rows:
+            yield DocumentSnapshot(self._collection.document(doc_id), data,
+                                   self._collection._update_times.get(doc_id), self._fields)
+
+    def get(self, transaction=None):
+        return list(self.stream())
+
+    def on_snapshot(self, callback):
+        return self._collection._watch(self, callback)
+
+
+class Watch:
+    def __init__(self, collection, query, callback):
+        self._collection = collection
+        self._query = query
+        self._callback = callback
+        self._members = set()
+        self.is_active = True
+
+    def _matches(self, data):
+        return data is not None and all(_matches(data, field, op, value) for field, op, value in self._query._filters)
+
+    def _notify(self, changes):
+        docs = [DocumentSnapshot(self._collection.document(doc_id), self._collection._docs[doc_id])
+                for doc_id in self._members]
+        self._callback(docs, changes, datetime.now(timezone.utc))
+
+    def _initial(self):
+        changes = []
+        for doc_id, data in list(self._collection._docs.items()):
+            if self._matches(data):
+                self._members.add(doc_id)
+                changes.append(DocumentChange(ChangeType.ADDED, DocumentSnapshot(self._collection.document(doc_id), data)))
+        # Listeners are billed like a query for the first snapshot, then per change
+        self._collection._client._count_reads(max(1, len(changes)))
+        # The first snapshot is delivered even when nothing matches
+        self._notify(changes)
+
+    def _changed(self, doc_ids):
+        changes = []
+        for doc_id in doc_ids:
+            data = self._collection._docs.get(doc_id)
+            snapshot = DocumentSnapshot(self._collection.document(doc_id), data)
+            if self._matches(data):
+                change_type = ChangeType.MODIFIED if doc_id in self._members else ChangeType.ADDED
+                self._members.add(doc_id)
+                changes.append(DocumentChange(change_type, snapshot))
+            elif doc_id in self._members:
+                self._members.discard(doc_id)
+                changes.append(DocumentChange(ChangeType.REMOVED, snapshot))
+        if self.is_active and changes:
+            self._collection._client._count_reads(len(changes))
+            self._notify(changes)
+
+    def unsubscribe(self):
+        self.is_active = False
+        self._collection._watches.discard(self)
+
+
+class CollectionReference(Query):
+    def __init__(self, client, collection_id):
+        super().__init__(self)
+        self._client = client
+        self.id = collection_id
+        self._docs = {}
+        self._update_times = {}
+        self._watches = set()
+        self._lock = threading.RLock()
+
+    def document(self, document_id=None):
+        return DocumentReference(self, document_id or uuid.uuid4().hex[:20])
+
+    def add(self, document_data, document_id=None):
+        ref = self.document(document_id)
+        ref.create(document_data)
+        return self._update_times[ref.id], ref
+
+    def _watch(self, query, callback):
+        watch = Watch(self, query, callback)
+        with self._lock:
+            self._watches.add(watch)
+            watch._initial()
+        return watch
+
+    def _changed(self, doc_ids):
+        for watch in list(self._watches):
+            watch._changed(doc_ids)
+
+
+class DocumentReference:
+    def __init__(self, collection, document_id):
+        self._collection = collection
+        self.id = document_id
+        self.path = f'{collection.id}/{document_id}'
+
+    def __eq__(self, other):
+        return isinstance(other, DocumentReference) and other.path == self.path
+
+    def __hash__(self):
+        return hash(self.path)
+
+    def _snapshot(self, field_paths=None):
+        docs = self._collection._docs
+        return DocumentSnapshot(self, docs.get(self.id), self._collection._update_times.get(self.id), field_paths)
+
+    def get(self, field_paths=None, transaction=None):
+        client = self._collection._client
+        client._round_trip()
+        client._count_reads(1)
+        return self._snapshot(field_paths)
+
+    def create(self, document_data):
+        batch = self._collection._client.batch()
+        batch.create(self, document_data)
+        batch.commit()
+
+    def set(self, document_data, merge=False):
+        batch = self._collection._client.batch()
+        batch.set(self, document_data, merge=merge)
+        batch.commit()
+
+    def update(self, field_updates, option=None):
+        batch = self._collection._client.batch()
+        batch.update(self, field_updates, option=option)
+        batch.commit()
+
+    def delete(self, option=None):
+        batch = self._collection._client.batch()
+        batch.delete(self, option=option)
+        batch.commit()
+
+
+class LastUpdateOption:
+    def __init__(self, last_update_time):
+        self.last_update_time = last_update_time
+
+
+class WriteBatch:
+    def __init__(self, client):
+        self._client = client
+        self._writes = []
+
+    def __len__(self):
+        return len(self._writes)
+
+    def create(self, reference, document_data):
+        self._writes.append(('create', reference, document_data, None))
+        return self
+
+    def set(self, reference, document_data, merge=False):
+        self._writes.append(('merge' if merge else 'set', reference, document_data, None))
+        return self
+
+    def update(self, reference, field_updates, option=None):
+        self._writes.append(('update', reference, field_updates, option))
+        return self
+
+    def delete(self, reference, option=None):
+        self._writes.append(('delete', reference, None, option))
+        return self
+
+    def _check(self, kind, reference, option):
+        docs = reference._collection._docs
+        if kind == 'create' and reference.id in docs:
+            raise FailedPrecondition(f'Document already exists: {reference.path}')
+        if kind == 'update' and reference.id not in docs:
+            raise NotFound(f'No document to update: {reference.path}')
+        if option is not None and reference._collection._update_times.get(reference.id) != option.last_update_time:
+            raise FailedPrecondition(f'Document changed since {option.last_update_time}: {reference.path}')
+
+    def commit(self):
+        if len(self._writes) > BATCH_LIMIT:
+            raise InvalidArgument(f'maximum {BATCH_LIMIT} writes allowed per request')
+        client = self._client
+        client._round_trip()
+        with client._lock:
+            for kind, reference, _, option in self._writes:
+                self._check(kind, reference, option)
+            now = client._next_update_time()
+            touched = {}
+            for kind, reference, data, _ in self._writes:
+                collection = reference._collection
+                with collection._lock:
+                    if kind == 'delete':
+                        collection._docs.pop(reference.id, None)
+                        collection._update_times.pop(reference.id, None)
+                    else:
+                        if kind in ('set', 'create'):
+                            document = {}
+                        else:
+                            document = _copy(collection._docs.get(reference.id, {}))
+                        if kind == 'update':
+                            for path, value in data.items():
+                                *parents, leaf = path.split('.')
+                                target = document
+                                for part in parents:
+                                    target = target.setdefault(part, {})
+                                target[leaf] = _resolve_transform(target.get(leaf), value, now)
+                        else:
+                            _apply(document, data, now, merge=kind == 'merge')
+                        collection._docs[reference.id] = document
+                        collection._update_times[reference.id] = now
+                touched.setdefault(collection, []).append(reference.id)
+            client.writes += len(self._writes)
+            for collection, doc_ids in touched.items():
+                collection._changed(doc_ids)
+        self._writes = []
+        return []
+
+
+class FakeFirestore:
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.reads = 0
+        self.writes = 0
+        self.round_trips = 0
+        self._collections = {}
+        self._lock = threading.RLock()
+        self._clock = datetime.now(timezone.utc)
+
+    def _round_trip(self):
+        with self._lock:
+            self.round_trips += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _count_reads(self, count):
+        with self._lock:
+            self.reads += count
+
+    def _next_update_time(self):
+        # Strictly increasing, like Firestore commit times
+        self._clock = max(self._clock + timedelta(microseconds=1), datetime.now(timezone.utc))
+        return self._clock
+
+    def collection(self, collection_id):
+        with self._lock:
+            if collection_id not in self._collections:
+                self._collections[collection_id] = CollectionReference(self, collection_id)
+            return self._collections[collection_id]
+
+    def batch(self):
+        return WriteBatch(self)
+
+    def get_all(self, references, field_paths=None, transaction=None):
+        references = list(references)
+        self._round_trip()
+        self._count_reads(len(references))
+        for reference in references:
+            yield reference._snapshot(field_paths)
+
+    @staticmethod
+    def write_option(last_update_time=None, **kwargs):
+        return LastUpdateOption(last_update_time)
+
+    def transaction(self, **kwargs):
+        raise NotImplementedError('FakeFirestore does not support transactions; use batches')
+
+    def load(self, collection_id, documents):
+        """Insert ``(document_id, data)`` pairs directly, without counting writes.
+
+        ``data`` is stored as given, so timestamps should already be aware UTC.
+        """
+        collection = self.collection(collection_id)
+        now = self._next_update_time()
+        with collection._lock:
+            for document_id, data in documents:
+                collection._docs[document_id] = data
+                collection._update_times[document_id] = now
+
+    def reset_stats(self):
+        with self._lock:
+            self.reads = self.writes = self.round_trips = 0
+
+    def stats(self):
+        return {'reads': self.reads, 'writes': self.writes, 'round_trips': self.round_trips}
@@ -0,0 +1,265 @@
+"""Push simulated detector traffic through ``utils.ingest`` into the in-memory fake.
+
+    python -m benchmarks.ingest
+    python -m benchmarks.ingest --tracks 20000 --cameras 4 --latency-ms 50 --outage
+
+Each camera's detector runs on its own thread and reports vehicles as they
+park, get seen again while parked (duration growing, plate read on the
+first sighting after parking) and leave. The same traffic is sent once
+through an ``Ingestor`` per camera and once as one write per observation,
+as a detector writing directly would. ``--outage`` makes every write fail
+for a while from a third of the way through, so batches go to the disk
+spool and are written once the fake comes back. Halfway through, every day's rollup is rebuilt
+from the raw documents, as a first view of the day does while vehicles are still parked.
+Afterwards the violations, daily rollups and plate counts are checked against each other,
+durations included.
+"""
+import argparse
+import math
+import os
+import random
+import string
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timezone
+from unittest import mock
+
+from google.api_core.exceptions import ServiceUnavailable
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Vehicles parked in front of one camera at any moment
+PARKED = 25
+VEHICLE_TYPES = ('car', 'car', 'car', 'motorcycle', 'truck')
+
+# Held around every write, so the rebuild halfway through sees none half-applied
+WRITING = threading.RLock()
+
+
+def detections(camera_id, tracks, sightings, seed=0):
+    """Yield ``(action, track_id, fields)`` for one camera's ``tracks`` vehicles."""
+    rng = random.Random(f'{seed}-{camera_id}')
+    plates = [''.join(rng.choices(string.ascii_uppercase, k=3)) + ' ' + ''.join(rng.choices(string.digits, k=4))
+              for _ in range(max(10, tracks // 4))]
+    parked = {}
+    started = 0
+    while started < tracks or parked:
+        if started < tracks and len(parked) < PARKED:
+            track_id = started
+            started += 1
+            parked[track_id] = [sightings, 5.0]
+            yield 'record', track_id, {'vehicle_type': rng.choice(VEHICLE_TYPES), 'color': 'white',
+                                       'duration': 5.0, 'image_url': ''}
+            continue
+        track_id = rng.choice(list(parked))
+        remaining, duration = parked[track_id]
+        if not remaining:
+            del parked[track_id]
+            yield 'resolve', track_id, {}
+            continue
+        fields = {'duration': duration + 0.5}
+        if remaining == sightings:
+            fields['plate_number'] = rng.choice(plates)
+        parked[track_id] = [remaining - 1, duration + 0.5]
+        yield 'record', track_id, fields
+
+
+def _batched(db, camera_id, events, spool_dir, stats):
+    from utils import ingest
+
+    with ingest.Ingestor(db, camera_id, location=camera_id, spool_dir=os.path.join(spool_dir, camera_id)) as ingestor:
+        for action, track_id, fields in events:
+            if action == 'record':
+                ingestor.record(track_id, **fields)
+            else:
+                ingestor.resolve(track_id)
+    # Writes that failed at close stay spooled until the next run; retry here
+    while ingestor._spooled:
+        time.sleep(0.1)
+        ingestor.flush()
+    stats[camera_id] = ingestor.stats
+
+
+def _one_by_one(db, camera_id, events, spool_dir, stats):
+    from utils import plates
+    from utils import rollups
+    from utils import violations as violations_data
+
+    collection = db.collection(violations_data.COLLECTION)
+    tracks = {}
+
+    def write(action, track_id, fields):
+        doc = collection.document(f'{camera_id}-{track_id}')
+        if action == 'create':
+            doc.set(tracks[track_id])
+            rollups.record_violation(db, tracks[track_id])
+        elif action == 'record':
+            doc.set(fields, merge=True)
+        elif action == 'plate':
+            doc.set(fields, merge=True)
+            plates.plate_ref(db, fields['plate_number']).set(plates.record_updates(tracks[track_id]), merge=True)
+        else:
+            doc.set({'status': 'resolved'}, merge=True)
+            rollups.rollup_ref(db, tracks[track_id]['timestamp']).set(rollups.resolve_updates([tracks[track_id]]), merge=True)
+
+    for action, track_id, fields in events:
+        if action == 'record' and track_id not in tracks:
+            action = 'create'
+            tracks[track_id] = dict(fields, timestamp=datetime.now(timezone.utc), status='active', camera_id=camera_id)
+        elif action == 'record':
+            if fields.get('plate_number') and not tracks[track_id].get('plate_number'):
+                action = 'plate'
+            tracks[track_id].update(fields)
+        while True:
+            try:
+                with WRITING:
+                    write(action, track_id, fields)
+                break
+            except ServiceUnavailable:
+                # No spool: all a plain writer can do is wait and retry
+                time.sleep(0.05)
+        if action == 'resolve':
+            del tracks[track_id]
+    stats[camera_id] = {}
+
+
+def rebuild(db):
+    """Rebuild every day's rollup from the raw violations."""
+    from utils import rollups
+    from utils import violations as violations_data
+
+    with WRITING:
+        violations = [doc.to_dict() for doc in db.collection(violations_data.COLLECTION).stream()]
+        days = sorted({date.fromisoformat(rollups.day_key(violation['timestamp'])) for violation in violations})
+        rollups.write_days(db, rollups.build_days(violations, days))
+
+
+def check(db, tracks):
+    """Problems found comparing violations with their rollups and plate counts."""
+    from utils import plates
+    from utils import rollups
+    from utils import violations as violations_data
+
+    violations = [doc.to_dict() for doc in db.collection(violations_data.COLLECTION).stream()]
+    days = [doc.to_dict() for doc in db.collection(rollups.ROLLUP_COLLECTION).stream()]
+    counts = [doc.to_dict() for doc in db.collection(plates.PLATE_COLLECTION).stream()]
+    problems = []
+    if len(violations) != tracks:
+        problems.append(f'{len(violations)} violations for {tracks} vehicles')
+    if any(violation.get('status') != 'resolved' for violation in violations):
+        problems.append('violations left active')
+    total = sum(day.get('total', 0) for day in days)
+    resolved = sum(day.get('status', {}).get('resolved', 0) for day in days)
+    if total != tracks or resolved != tracks:
+        problems.append(f'rollups count {total} violations, {resolved} resolved')
+    # Durations as a rebuild from the raw documents would count them
+    expected = rollups.build_days(violations, [date.fromisoformat(day['date']) for day in days])
+    for day in days:
+        built = expected[day['date']]
+        if (not math.isclose(day.get('duration_sum', 0), built['duration_sum'])
+                or day.get('duration_count', 0) != built['duration_count']
+                or day.get('duration_min') != built['duration_min']
+                or day.get('duration_max') != built['duration_max']):
+            problems.append(f"rollup durations for {day['date']} disagree with violations")
+    with_plates = sum(1 for violation in violations if violation.get('plate_number'))
+    if sum(count.get('total', 0) for count in counts) != with_plates:
+        problems.append('plate counts disagree with violations')
+    return problems
+
+
+def run(mode, args, spool_dir):
+    from benchmarks.fake_firestore import FakeFirestore, WriteBatch
+
+    db = FakeFirestore(latency=args.latency_ms / 1000)
+    cameras = [f'cam-{index + 1:02d}' for index in range(args.cameras)]
+    # Generated up front so the timing covers writing only
+    traffic = {camera_id: list(detections(camera_id, args.tracks // args.cameras, args.sightings, args.seed))
+               for camera_id in cameras}
+    events = sum(len(camera_events) for camera_events in traffic.values())
+
+    offline = threading.Event()
+    commit = WriteBatch.commit
+
+    def flaky_commit(batch):
+        with WRITING:
+            if offline.is_set():
+                raise ServiceUnavailable('simulated outage')
+            return commit(batch)
+
+    sent = dict.fromkeys(cameras, 0)
+
+    def feed(camera_id):
+        for event in traffic[camera_id]:
+            sent[camera_id] += 1
+            yield event
+
+    stats = {}
+    target = _batched if mode == 'batched' else _one_by_one
+    threads = [threading.Thread(target=target, args=(db, camera_id, feed(camera_id), spool_dir, stats))
+               for camera_id in cameras]
+    with mock.patch.object(WriteBatch, 'commit', flaky_commit):
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        if args.outage:
+            # Fail every write from a third of the way through the traffic
+            while sum(sent.values()) < events / 3 and any(thread.is_alive() for thread in threads):
+                time.sleep(0.01)
+            offline.set()
+            time.sleep(args.outage_s)
+            offline.clear()
+        while sum(sent.values()) < events / 2 and any(thread.is_alive() for thread in threads):
+            time.sleep(0.01)
+        rebuild(db)
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+    totals = {key: sum(camera.get(key, 0) for camera in stats.values()) for key in ('coalesced', 'spooled', 'replayed')}
+    return {
+        'mode': mode,
+        'events': events,
+        'seconds': round(elapsed, 2),
+        'events_per_s': round(events / elapsed),
+        'commits': db.round_trips,
+        'writes': db.writes,
+        **totals,
+        'problems': check(db, len(cameras) * (args.tracks // args.cameras)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark batched violation ingestion against the in-memory fake.')
+    parser.add_argument('--tracks', type=int, default=20_000, help='vehicles reported, split across cameras')
+    parser.add_argument('--cameras', type=int, default=4)
+    parser.add_argument('--sightings', type=int, default=8, help='updates per vehicle while it is parked')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='simulated round-trip time per request')
+    parser.add_argument('--outage', action='store_true', help='fail all writes for part of the run')
+    parser.add_argument('--outage-s', type=float, default=1.0, help='length of the outage')
+    parser.add_argument('--one-by-one-tracks', type=int, default=2_000,
+                        help='vehicles for the one-write-per-observation baseline, which is much slower')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    import streamlit.logger
+
+    # The app's modules define cached functions, which warn outside a server
+    streamlit.logger.set_log_level('error')
+    sys.path.insert(0, ROOT)
+
+    print(f"{'mode':<12} {'events':>8} {'seconds':>8} {'events/s':>9} {'commits':>8} {'writes':>8} "
+          f"{'coalesced':>9} {'spooled':>8} {'replayed':>8}  check")
+    for mode in ('batched', 'one-by-one'):
+        mode_args = argparse.Namespace(**vars(args))
+        if mode == 'one-by-one':
+            mode_args.tracks = min(args.tracks, args.one_by_one_tracks)
+        with tempfile.TemporaryDirectory(prefix='violation-spool-') as spool_dir:
+            result = run(mode, mode_args, spool_dir)
+        print(f"{result['mode']:<12} {result['events']:>8} {result['seconds']:>8} {result['events_per_s']:>9} "
+              f"{result['commits']:>8} {result['writes']:>8} {result['coalesced']:>9} {result['spooled']:>8} "
+              f"{result['replayed']:>8}  {'; '.join(result['problems']) or 'consistent'}")
+
+
+if __name__ == '__main__':
+    main()
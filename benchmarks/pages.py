@@ -0,0 +1,127 @@
+"""Drive every page through Streamlit's ``AppTest`` at several data sizes.
+
+    python -m benchmarks.pages
+    python -m benchmarks.pages --sizes 1000 10000 --pages pages/3_Analytics.py --json results.json
+
+For each size the in-memory fake is filled with synthetic violations, then
+each page gets a cold run (empty caches), a warm rerun, and a second cold
+run under ``tracemalloc`` for peak memory. Reported per run: wall time,
+documents read (Firestore billing) and peak Python memory. Times include the
+fake's own query cost; pass ``--latency-ms`` to add a network round trip.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGES = ('streamlit_app.py', 'pages/1_Dashboard.py', 'pages/2_Live_Violations.py', 'pages/3_Analytics.py',
+         'pages/4_Plate_Lookup.py', 'pages/5_Export.py')
+SIZES = (1_000, 10_000, 100_000, 1_000_000)
+
+
+def _quiet():
+    import streamlit.logger
+
+    # Outside a server every cache call logs a warning, and AppTest resets
+    # the level whenever it loads a script
+    streamlit.logger.set_log_level('error')
+
+
+def _clear_caches(cache_root):
+    import streamlit as st
+
+    _quiet()
+    st.cache_data.clear()
+    st.cache_resource.clear()
+    # On-disk caches (thumbnails, history) live under the benchmark's temp dir
+    for entry in os.scandir(cache_root):
+        if entry.is_dir():
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def _run(db, page, timeout, app=None):
+    from streamlit.testing.v1 import AppTest
+
+    if app is None:
+        app = AppTest.from_file(os.path.join(ROOT, page), default_timeout=timeout)
+    _quiet()
+    reads = db.reads
+    started = time.perf_counter()
+    app.run()
+    elapsed = time.perf_counter() - started
+    errors = [str(e.value) for e in app.exception] + [str(e.value) for e in app.error]
+    return app, elapsed, db.reads - reads, errors
+
+
+def bench_page(db, page, cache_root, timeout):
+    _clear_caches(cache_root)
+    app, cold, cold_reads, errors = _run(db, page, timeout)
+    _, warm, warm_reads, warm_errors = _run(db, page, timeout, app)
+
+    _clear_caches(cache_root)
+    tracemalloc.start()
+    _run(db, page, timeout)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        'page': page,
+        'cold_s': round(cold, 3),
+        'rerun_s': round(warm, 3),
+        'cold_reads': cold_reads,
+        'rerun_reads': warm_reads,
+        'peak_mb': round(peak / 1e6, 1),
+        'errors': errors + warm_errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark page reruns against synthetic data.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--pages', nargs='+', default=PAGES)
+    parser.add_argument('--days', type=int, default=365, help='days of history to spread violations over')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='simulated round-trip time per request')
+    parser.add_argument('--timeout', type=float, default=600, help='seconds allowed per page run')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    # Keep the app's on-disk caches away from a real deployment's
+    cache_root = tempfile.mkdtemp(prefix='violation-bench-')
+    tempfile.tempdir = cache_root
+    sys.path.insert(0, ROOT)
+
+    from benchmarks.fake_firestore import FakeFirestore
+    from benchmarks.synthetic import populate
+    from utils import bootstrap
+
+    results = []
+    print(f"{'docs':>9}  {'page':<28} {'cold s':>8} {'rerun s':>8} {'cold reads':>10} {'rerun reads':>11} {'peak MB':>8}")
+    try:
+        for size in args.sizes:
+            db = FakeFirestore(latency=args.latency_ms / 1000)
+            populate(db, size, days=args.days, seed=args.seed)
+            with mock.patch.object(bootstrap, 'get_db', lambda: db):
+                for page in args.pages:
+                    result = dict(bench_page(db, page, cache_root, args.timeout), docs=size)
+                    results.append(result)
+                    print(f"{size:>9}  {page:<28} {result['cold_s']:>8} {result['rerun_s']:>8} "
+                          f"{result['cold_reads']:>10} {result['rerun_reads']:>11} {result['peak_mb']:>8}")
+                    for error in result['errors']:
+                        print(f"{'':>11}error: {error}")
+            del db
+    finally:
+        shutil.rmtree(cache_root, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
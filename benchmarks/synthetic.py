@@ -0,0 +1,110 @@
+"""Deterministic, realistic violation documents for benchmarks.
+
+The same ``seed`` always yields the same documents. Vehicle types follow a
+fixed mix, a small set of plates accounts for most repeat violations,
+durations are log-normal around a quarter of an hour, and timestamps follow
+the road's daily traffic (morning and evening peaks, quiet nights).
+Violations from the last couple of hours are still active, as are a few
+older ones nobody resolved.
+"""
+import bisect
+import itertools
+import math
+import random
+import string
+from datetime import datetime, timedelta, timezone
+
+from utils import health
+from utils import plates
+from utils import rollups
+
+VEHICLE_TYPES = {'car': 0.62, 'motorcycle': 0.28, 'truck': 0.10}
+COLORS = ('white', 'black', 'silver', 'gray', 'red', 'blue')
+# One camera per location along the main road
+CAMERAS = {
+    'cam-01': 'Tagapo Main Road',
+    'cam-02': 'Tagapo Market',
+    'cam-03': 'Tagapo Elementary School',
+    'cam-04': 'Tagapo Chapel',
+}
+
+# Relative number of violations per hour of the day (local time, UTC+8)
+HOURLY_WEIGHTS = (
+    1, 1, 1, 1, 2, 4, 8, 14, 16, 12, 10, 10,
+    11, 10, 10, 11, 13, 16, 15, 10, 7, 5, 3, 2,
+)
+UTC_OFFSET = 8
+
+ACTIVE_WINDOW = timedelta(hours=2)
+UNRESOLVED_RATE = 0.02
+
+
+def _plate(rng):
+    return ''.join(rng.choices(string.ascii_uppercase, k=3)) + ' ' + ''.join(rng.choices(string.digits, k=4))
+
+
+def generate_violations(count, days=365, seed=0, now=None):
+    """Yield ``count`` ``(document_id, violation)`` pairs spread over the last ``days`` days."""
+    rng = random.Random(seed)
+    now = now or datetime.now(timezone.utc)
+    start = (now - timedelta(days=days)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    # Plate popularity follows a Zipf-like curve, so a few plates repeat a lot
+    plates = [_plate(rng) for _ in range(max(20, count // 6))]
+    plate_weights = list(itertools.accumulate(1 / (rank + 1) ** 1.1 for rank in range(len(plates))))
+    hour_weights = list(itertools.accumulate(HOURLY_WEIGHTS))
+    vehicle_types = list(VEHICLE_TYPES)
+    vehicle_weights = list(itertools.accumulate(VEHICLE_TYPES.values()))
+    camera_ids = list(CAMERAS)
+
+    for index in range(count):
+        local_hour = bisect.bisect(hour_weights, rng.random() * hour_weights[-1])
+        day = start + timedelta(days=rng.randrange(days + 1))
+        timestamp = day + timedelta(hours=local_hour - UTC_OFFSET, seconds=rng.randrange(3600))
+        if timestamp > now:
+            timestamp = now - timedelta(seconds=rng.randrange(int(ACTIVE_WINDOW.total_seconds())))
+        duration = round(min(240.0, max(1.0, rng.lognormvariate(math.log(15), 0.6))), 1)
+        camera_id = rng.choice(camera_ids)
+        violation = {
+            'timestamp': timestamp,
+            'vehicle_type': vehicle_types[bisect.bisect(vehicle_weights, rng.random() * vehicle_weights[-1])],
+            'plate_number': plates[bisect.bisect(plate_weights, rng.random() * plate_weights[-1])],
+            'color': rng.choice(COLORS),
+            'location': CAMERAS[camera_id],
+            'camera_id': camera_id,
+            'duration': duration,
+            'status': 'active',
+            'image_url': '',
+        }
+        if now - timestamp > ACTIVE_WINDOW and rng.random() >= UNRESOLVED_RATE:
+            violation['status'] = 'resolved'
+            violation['resolved_at'] = timestamp + timedelta(minutes=duration)
+        yield f'bench{seed:03d}{index:012d}', violation
+
+
+def collections(count, days=365, seed=0, with_rollups=True):
+    """Generated violations, camera heartbeats and, optionally, daily rollups and plate counts, as ``{collection: [(id, document)]}``."""
+    now = datetime.now(timezone.utc)
+    documents = list(generate_violations(count, days, seed, now))
+    result = {
+        'violations': documents,
+        # Every camera sent a heartbeat just now
+        health.HEARTBEAT_COLLECTION: [(camera_id, {'location': location, 'last_seen': now})
+                                      for camera_id, location in CAMERAS.items()],
+    }
+    if with_rollups:
+        # Early-morning local times fall on the previous UTC day
+        first = (now - timedelta(days=days + 1)).date()
+        docs = rollups.build_days((violation for _, violation in documents), rollups.date_range(first, now.date()))
+        # As ``python -m utils.rollups`` leaves them
+        result[rollups.ROLLUP_COLLECTION] = [(key, dict(doc, rebuilt_at=now)) for key, doc in docs.items()]
+        result[plates.PLATE_COLLECTION] = list(plates.build_counts(violation for _, violation in documents).items())
+    return result
+
+
+def populate(db, count, days=365, seed=0, with_rollups=True):
+    """Fill a ``FakeFirestore`` with generated violations and, optionally, their rollups and plate counts."""
+    generated = collections(count, days, seed, with_rollups)
+    for collection_id, documents in generated.items():
+        db.load(collection_id, documents)
+    return len(generated['violations'])
@@ -1,142 +1,18 @@
 import streamlit as st
-import firebase_admin
-from firebase_admin import credentials, firestore
-import pandas as pd
 from datetime import datetime, timedelta
 
-st.set_page_config(page_title="Dashboard", page_icon="📊", layout="wide")
-
-# Same clean styling
-st.markdown("""
-    <style>
-    @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700;800&display=swap');
-    
-    * {
-        font-family: 'Inter', sans-serif;
-    }
-    
-    .stApp {
-        background: #ffffff;
-    }
-    
-    #MainMenu {visibility: hidden;}
-    footer {visibility: hidden;}
-    .stDeployButton {display: none;}
-    
-    .header-container {
-        background: linear-gradient(135deg, #5b21b6 0%, #7c3aed 100%);
-        text-align: center;
-        padding: 2.5rem 2rem;
-        margin: -2rem -2rem 2rem -2rem;
-        border-radius: 0 0 24px 24px;
-    }
-    
-    .page-title {
-        font-size: 2.5rem;
-        font-weight: 800;
-        color: white;
-        margin-bottom: 0.5rem;
-    }
-    
-    .page-subtitle {
-        font-size: 1rem;
-        color: rgba(255, 255, 255, 0.9);
-        font-weight: 400;
-    }
-    
-    .clean-card {
-        background: white;
-        border-radius: 16px;
-        padding: 2rem;
-        box-shadow: 0 1px 3px rgba(0, 0, 0, 0.1);
-        margin-bottom: 1.5rem;
-        border: 1px solid #e5e7eb;
-    }
-    
-    .clean-card:hover {
-        box-shadow: 0 4px 12px rgba(91, 33, 182, 0.1);
-        border-color: #c4b5fd;
-    }
-    
-    .section-header {
-        font-size: 1.5rem;
-        font-weight: 700;
-        color: #111827;
-        margin-bottom: 1.5rem;
-        padding-bottom: 0.75rem;
-        border-bottom: 3px solid #7c3aed;
-        display: inline-block;
-    }
-    
-    .metric-container {
-        text-align: center;
-        padding: 1.5rem;
-        background: white;
-        border-radius: 12px;
-        border: 2px solid #e5e7eb;
-        transition: all 0.3s ease;
-    }
-    
-    .metric-container:hover {
-        border-color: #7c3aed;
-        box-shadow: 0 4px 12px rgba(124, 58, 237, 0.15);
-    }
-    
-    .metric-value {
-        font-size: 2.5rem;
-        font-weight: 800;
-        color: #7c3aed;
-        line-height: 1;
-        margin-bottom: 0.5rem;
-    }
-    
-    .metric-label {
-        font-size: 0.875rem;
-        color: #6b7280;
-        font-weight: 600;
-        text-transform: uppercase;
-        letter-spacing: 0.5px;
-    }
-    
-    .metric-delta {
-        font-size: 0.75rem;
-        margin-top: 0.5rem;
-        font-weight: 600;
-    }
-    
-    [data-testid="stSidebar"] {
-        background: linear-gradient(180deg, #5b21b6 0%, #7c3aed 100%);
-    }
-    
-    [data-testid="stSidebar"] * {
-        color: white !important;
-    }
-    
-    .stButton>button {
-        background: #7c3aed;
-        color: white;
-        border: none;
-        border-radius: 8px;
-        padding: 0.5rem 1.5rem;
-        font-weight: 600;
-    }
-    
-    .stButton>button:hover {
-        background: #6d28d9;
-        box-shadow: 0 4px 12px rgba(124, 58, 237, 0.3);
-    }
-    </style>
-""", unsafe_allow_html=True)
+from utils import bootstrap
+from utils import cameras
+from utils import concurrency
+from utils import metrics
+from utils import rollups
+from utils import theme
+from utils import violations as violations_data
 
-# Initialize Firebase
-@st.cache_resource
-def init_firebase():
-    if not firebase_admin._apps:
-        cred = credentials.Certificate(dict(st.secrets["firebase"]))
-        firebase_admin.initialize_app(cred)
-    return firestore.client()
+st.set_page_config(page_title="Dashboard", page_icon="📊", layout="wide")
+metrics.begin_rerun("Dashboard")
 
-db = init_firebase()
+theme.apply()
 
 # Header
 st.markdown("""
@@ -145,6 +21,13 @@ st.markdown("""
         <div class="page-subtitle">Comprehensive violation statistics and insights</div>
     </div>
 """, unsafe_allow_html=True)
+metrics.painted()
+
+# Loaded once the header is on screen, so the page paints before pandas
+from utils import frames
+
+db = bootstrap.get_db()
+camera_ids = cameras.select(db)
 
 # Date filter
 col1, col2 = st.columns([3, 1])
@@ -152,6 +35,7 @@ with col1:
     date_filter = st.date_input("📅 Select Date", datetime.now())
 with col2:
     if st.button("🔄 Refresh Data"):
+        violations_data.clear_cache()
         st.rerun()
 
 st.markdown("<br>", unsafe_allow_html=True)
@@ -160,9 +44,13 @@ st.markdown("<br>", unsafe_allow_html=True)
 start_time = datetime.combine(date_filter, datetime.min.time())
 end_time = datetime.combine(date_filter, datetime.max.time())
 
+# The summary's and the table's reads run together
+concurrency.submit(cameras.day_rollup, db, camera_ids, date_filter)
+concurrency.submit(cameras.violations_between, db, camera_ids, start_time, end_time, violations_data.TABLE_FIELDS)
+
 try:
-    violations_ref = db.collection('violations').where('timestamp', '>=', start_time).where('timestamp', '<=', end_time).stream()
-    violations_list = [v.to_dict() for v in violations_ref]
+    day_rollup = cameras.day_rollup(db, camera_ids, date_filter)
+    summary = rollups.summary(day_rollup)
     
     # Summary metrics
     st.markdown('<div class="clean-card">', unsafe_allow_html=True)
@@ -171,10 +59,10 @@ try:
     
     col1, col2, col3, col4 = st.columns(4)
     
-    total = len(violations_list)
-    active = len([v for v in violations_list if v.get('status') == 'active'])
-    resolved = total - active
-    avg_duration = sum([v.get('duration', 0) for v in violations_list]) / total if total > 0 else 0
+    total = summary['total']
+    active = summary['active']
+    resolved = summary['resolved']
+    avg_duration = summary['avg_duration']
     
     with col1:
         st.markdown(f"""
@@ -215,17 +103,24 @@ try:
     
     st.markdown("<br>", unsafe_allow_html=True)
     
+    # Per-camera counts
+    shown = cameras.shown(db, camera_ids)
+    if shown:
+        st.markdown('<div class="clean-card">', unsafe_allow_html=True)
+        st.markdown('<div class="section-header">📹 Violations by Camera</div>', unsafe_allow_html=True)
+        cameras.tiles(shown, day_rollup.get('cameras', {}), "Violations")
+        st.markdown('</div>', unsafe_allow_html=True)
+        
+        st.markdown("<br>", unsafe_allow_html=True)
+    
     # Vehicle type breakdown
-    if violations_list:
+    if total > 0:
         st.markdown('<div class="clean-card">', unsafe_allow_html=True)
         st.markdown('<div class="section-header">🚗 Violations by Vehicle Type</div>', unsafe_allow_html=True)
         
         col1, col2 = st.columns(2)
         
-        vehicle_counts = {}
-        for v in violations_list:
-            vtype = v.get('vehicle_type', 'unknown')
-            vehicle_counts[vtype] = vehicle_counts.get(vtype, 0) + 1
+        vehicle_counts = {vtype: count for vtype, count in day_rollup['vehicle_type'].items() if count}
         
         with col1:
             st.bar_chart(vehicle_counts)
@@ -246,13 +141,17 @@ try:
         # Detailed table
         st.markdown('<div class="clean-card">', unsafe_allow_html=True)
         st.markdown('<div class="section-header">📋 Detailed Violations</div>', unsafe_allow_html=True)
-        df = pd.DataFrame(violations_list)
+        violations_list = cameras.violations_between(
+            db, camera_ids, start_time, end_time, violations_data.TABLE_FIELDS
+        )
+        df = frames.build_frame(violations_list, violations_data.TABLE_FIELDS)
         if not df.empty:
             st.dataframe(
-                df[['timestamp', 'vehicle_type', 'plate_number', 'duration', 'status']], 
+                df, 
                 use_container_width=True,
                 hide_index=True
             )
+            st.caption(f"{len(df):,} rows · {frames.footprint(df) / 1024:,.0f} KB in memory")
         st.markdown('</div>', unsafe_allow_html=True)
     
     else:
@@ -266,3 +165,5 @@ try:
         
 except Exception as e:
     st.error(f"Error loading data: {e}")
+
+metrics.end_rerun()
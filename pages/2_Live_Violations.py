@@ -1,123 +1,24 @@
 import streamlit as st
-import firebase_admin
-from firebase_admin import credentials, firestore
-from datetime import datetime
 
-st.set_page_config(page_title="Live Violations", page_icon="🚨", layout="wide")
+from utils import bootstrap
+from utils import cameras
+from utils import live_store
+from utils import metrics
+from utils import refresh
+from utils import theme
+from utils import thumbnails
+from utils import violations as violations_data
 
-# Same styling
-st.markdown("""
-    <style>
-    @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700;800&display=swap');
-    
-    * {
-        font-family: 'Inter', sans-serif;
-    }
-    
-    .stApp {
-        background: #ffffff;
-    }
-    
-    #MainMenu {visibility: hidden;}
-    footer {visibility: hidden;}
-    .stDeployButton {display: none;}
-    
-    .header-container {
-        background: linear-gradient(135deg, #5b21b6 0%, #7c3aed 100%);
-        text-align: center;
-        padding: 2.5rem 2rem;
-        margin: -2rem -2rem 2rem -2rem;
-        border-radius: 0 0 24px 24px;
-    }
-    
-    .page-title {
-        font-size: 2.5rem;
-        font-weight: 800;
-        color: white;
-        margin-bottom: 0.5rem;
-    }
-    
-    .page-subtitle {
-        font-size: 1rem;
-        color: rgba(255, 255, 255, 0.9);
-        font-weight: 400;
-    }
-    
-    .clean-card {
-        background: white;
-        border-radius: 16px;
-        padding: 2rem;
-        box-shadow: 0 1px 3px rgba(0, 0, 0, 0.1);
-        margin-bottom: 1.5rem;
-        border: 1px solid #e5e7eb;
-    }
-    
-    .violation-card {
-        background: white;
-        border: 2px solid #fee2e2;
-        border-radius: 12px;
-        padding: 1.5rem;
-        margin-bottom: 1rem;
-        transition: all 0.3s ease;
-    }
-    
-    .violation-card:hover {
-        border-color: #fca5a5;
-        box-shadow: 0 4px 12px rgba(239, 68, 68, 0.1);
-    }
-    
-    .badge {
-        display: inline-block;
-        padding: 0.375rem 0.75rem;
-        border-radius: 9999px;
-        font-size: 0.75rem;
-        font-weight: 600;
-        text-transform: uppercase;
-        letter-spacing: 0.5px;
-    }
-    
-    .badge-active {
-        background: #fee2e2;
-        color: #dc2626;
-    }
-    
-    .badge-resolved {
-        background: #d1fae5;
-        color: #059669;
-    }
-    
-    [data-testid="stSidebar"] {
-        background: linear-gradient(180deg, #5b21b6 0%, #7c3aed 100%);
-    }
-    
-    [data-testid="stSidebar"] * {
-        color: white !important;
-    }
-    
-    .stButton>button {
-        background: #7c3aed;
-        color: white;
-        border: none;
-        border-radius: 8px;
-        padding: 0.5rem 1.5rem;
-        font-weight: 600;
-    }
-    
-    .stButton>button:hover {
-        background: #6d28d9;
-    }
-    </style>
-""", unsafe_allow_html=True)
+# How often each session checks the shared store for changes (seconds)
+LIVE_POLL_SECONDS = 2
+PAGE_SIZES = [10, 20, 50]
+
+st.set_page_config(page_title="Live Violations", page_icon="🚨", layout="wide")
+metrics.begin_rerun("Live Violations")
 
-# Initialize Firebase
-@st.cache_resource
-def init_firebase():
-    if not firebase_admin._apps:
-        cred = credentials.Certificate(dict(st.secrets["firebase"]))
-        firebase_admin.initialize_app(cred)
-    return firestore.client()
+theme.apply()
 
-db = init_firebase()
+refresh_interval = refresh.auto_refresh_interval()
 
 # Header
 st.markdown("""
@@ -126,87 +27,278 @@ st.markdown("""
         <div class="page-subtitle">Real-time monitoring of active parking violations</div>
     </div>
 """, unsafe_allow_html=True)
+metrics.painted()
+
+db = bootstrap.get_db()
+camera_ids = cameras.select(db)
 
 # Refresh button
 if st.button("🔄 Refresh"):
+    violations_data.clear_cache()
+    st.session_state.live_page = 0
+    st.session_state.live_extra_pages = 0
     st.rerun()
 
-st.info("🔄 Click refresh button to see latest violations", icon="ℹ️")
+# Shared listener-backed store; fall back to direct queries if it can't start
+try:
+    store = live_store.get_active_store(db)
+    # Only a session's first run waits for the first snapshot; later reruns
+    # use whatever the store has by then
+    store_live = store.ready.is_set() if 'live_store_waited' in st.session_state else store.wait_ready()
+    st.session_state.live_store_waited = True
+except Exception:
+    store = None
+    store_live = False
+
+if store is not None and not store_live:
+    st.warning("Live updates aren't connected yet; showing the latest query results instead", icon="⚠️")
+
+if store_live and refresh_interval:
+    st.info("🟢 Live: new and resolved violations appear automatically", icon="ℹ️")
+elif refresh_interval:
+    st.info(f"🔄 The list refreshes every {refresh_interval} seconds", icon="ℹ️")
+else:
+    st.info("🔄 Click refresh button to see latest violations", icon="ℹ️")
 
 st.markdown("<br>", unsafe_allow_html=True)
 
-# Get active violations (simplified query)
-try:
-    all_violations = db.collection('violations').stream()
-    violations_list = []
+
+@st.fragment(run_every=LIVE_POLL_SECONDS)
+def watch_store():
+    # Cheap version check; the page itself only reruns when the store changed
+    if store.version != st.session_state.get('live_version'):
+        st.rerun()
+
+
+if 'live_selected' not in st.session_state:
+    st.session_state.live_selected = set()
+    st.session_state.live_resolved = set()
+
+
+def resolve_one(violation_id):
+    # Button callback inside the card's fragment: only this card reruns
+    violations_data.resolve_violation(db, violation_id)
+    if store_live:
+        up_to_date = st.session_state.get('live_version') == store.version
+        store.discard(violation_id)
+        # Our own change doesn't need the rest of the page redrawn
+        if up_to_date:
+            st.session_state.live_version = store.version
+    st.session_state.live_selected.discard(violation_id)
+    st.session_state.live_resolved.add(violation_id)
+
+
+def resolve_selected():
+    resolved = violations_data.resolve_violations(db, list(st.session_state.live_selected))
+    if store_live:
+        for violation_id in resolved:
+            store.discard(violation_id)
+    clear_selection()
+    st.session_state.live_notice = f"Resolved {len(resolved)} violation{'s' if len(resolved) != 1 else ''}"
+
+
+def toggle_selected(violation_id):
+    if st.session_state[f"select_{violation_id}"]:
+        st.session_state.live_selected.add(violation_id)
+    else:
+        st.session_state.live_selected.discard(violation_id)
+
+
+def select(violation_ids):
+    for violation_id in violation_ids:
+        st.session_state.live_selected.add(violation_id)
+        st.session_state[f"select_{violation_id}"] = True
+
+
+def clear_selection():
+    for violation_id in st.session_state.live_selected:
+        if f"select_{violation_id}" in st.session_state:
+            st.session_state[f"select_{violation_id}"] = False
+    st.session_state.live_selected = set()
+
+
+@st.fragment
+def render_violation(data, selectable=False):
+    violation_id = data['id']
     
-    for violation in all_violations:
-        data = violation.to_dict()
-        if data.get('status') == 'active':
-            violations_list.append((violation.id, data))
+    if violation_id in st.session_state.live_resolved:
+        st.success(f"✅ {data.get('plate_number', 'N/A')} marked as resolved")
+        return
     
-    # Sort by timestamp
-    violations_list.sort(key=lambda x: x[1].get('timestamp', datetime.min), reverse=True)
+    st.markdown('<div class="violation-card">', unsafe_allow_html=True)
     
-    violations_found = False
-    for violation_id, data in violations_list:
-        violations_found = True
-        
-        st.markdown('<div class="violation-card">', unsafe_allow_html=True)
+    if selectable:
+        key = f"select_{violation_id}"
+        # Checkbox state is dropped while the card is off screen; restore it from the selection
+        if key not in st.session_state:
+            st.session_state[key] = violation_id in st.session_state.live_selected
+        st.checkbox("Select", key=key, on_change=toggle_selected, args=(violation_id,))
+    
+    col1, col2, col3 = st.columns([1, 2, 1])
+    
+    with col1:
+        if data.get('image_url'):
+            st.image(thumbnails.thumbnail(data['image_url'], 'medium'), use_column_width=True)
+            st.link_button("🔍 Full size", data['image_url'], use_container_width=True)
+        else:
+            st.markdown("""
+                <div style="background: #f9fafb; padding: 2rem; text-align: center; border-radius: 8px; border: 1px solid #e5e7eb;">
+                    <div style="font-size: 2rem;">📷</div>
+                    <div style="font-size: 0.75rem; color: #9ca3af; margin-top: 0.5rem;">No Image</div>
+                </div>
+            """, unsafe_allow_html=True)
+    
+    with col2:
+        vehicle = data.get('vehicle_type', 'Unknown').upper()
+        plate = data.get('plate_number', 'N/A')
+        color = data.get('color', 'N/A')
+        duration = data.get('duration', 0)
+        location = data.get('location', 'N/A')
         
-        col1, col2, col3 = st.columns([1, 2, 1])
+        st.markdown(f"### 🚗 {vehicle}")
+        st.markdown(f"**Plate Number:** {plate}")
+        st.markdown(f"**Color:** {color}")
+        st.markdown(f"**⏱️ Duration:** {duration:.1f} minutes")
+        st.markdown(f"**📍 Location:** {location}")
+        if data.get('camera_id'):
+            st.markdown(f"**📹 Camera:** {data['camera_id']}")
         
-        with col1:
-            if data.get('image_url'):
-                st.image(data['image_url'], use_column_width=True)
-            else:
-                st.markdown("""
-                    <div style="background: #f9fafb; padding: 2rem; text-align: center; border-radius: 8px; border: 1px solid #e5e7eb;">
-                        <div style="font-size: 2rem;">📷</div>
-                        <div style="font-size: 0.75rem; color: #9ca3af; margin-top: 0.5rem;">No Image</div>
-                    </div>
-                """, unsafe_allow_html=True)
+        timestamp = data.get('timestamp')
+        if timestamp:
+            st.markdown(f"**🕐 Time:** {timestamp.strftime('%Y-%m-%d %H:%M:%S')}")
+    
+    with col3:
+        st.markdown('<div class="badge badge-active" style="font-size: 1rem; padding: 0.5rem 1rem;">🔴 ACTIVE</div>', unsafe_allow_html=True)
+        st.markdown("<br>", unsafe_allow_html=True)
         
+        st.button("✅ Mark as Resolved", key=violation_id, on_click=resolve_one, args=(violation_id,))
+    
+    st.markdown('</div>', unsafe_allow_html=True)
+
+
+# Window of the card list being shown: page number plus any "load more" pages
+if 'live_page' not in st.session_state:
+    st.session_state.live_page = 0
+    st.session_state.live_extra_pages = 0
+
+
+def go_to_page(page):
+    st.session_state.live_page = page
+    st.session_state.live_extra_pages = 0
+
+
+def load_more():
+    st.session_state.live_extra_pages += 1
+
+
+def jump_to_page():
+    go_to_page(st.session_state.live_jump - 1)
+
+
+# Card list; its widgets rerun only this fragment, and each card is a fragment
+# of its own. Without the listener store it re-queries on the refresh timer.
+def live_list():
+    if 'live_notice' in st.session_state:
+        st.toast(st.session_state.pop('live_notice'), icon="✅")
+    
+    # Only the visible window is fetched and rendered
+    try:
+        shown = cameras.shown(db, camera_ids)
+        if store_live:
+            st.session_state.live_version = store.version
+            total = store.count(camera_ids)
+            by_camera = store.counts_by_camera()
+        else:
+            by_camera = cameras.active_counts(db, [camera['id'] for camera in shown]) if shown else {}
+            total = violations_data.count_active_violations(db) if camera_ids is None else sum(by_camera.values())
+        cameras.tiles(shown, by_camera, "Active")
+    
+        # Bulk mode filters the full active list in memory and adds selection boxes
+        bulk_mode = st.toggle("☑️ Bulk resolve", on_change=go_to_page, args=(0,))
+        matching = None
+        if bulk_mode:
+            everything = store.violations(camera_ids) if store_live else cameras.active_window(db, camera_ids, 0, total)
+            col1, col2 = st.columns(2)
+            with col1:
+                locations = st.multiselect("📍 Location", sorted({v.get('location', 'N/A') for v in everything}), on_change=go_to_page, args=(0,))
+            with col2:
+                vehicle_types = st.multiselect("🚗 Vehicle type", sorted({v.get('vehicle_type', 'unknown') for v in everything}), on_change=go_to_page, args=(0,))
+            matching = [
+                v for v in everything
+                if (not locations or v.get('location', 'N/A') in locations)
+                and (not vehicle_types or v.get('vehicle_type', 'unknown') in vehicle_types)
+            ]
+            total = len(matching)
+    
+        col1, col2, col3 = st.columns([2, 1, 1])
         with col2:
-            vehicle = data.get('vehicle_type', 'Unknown').upper()
-            plate = data.get('plate_number', 'N/A')
-            color = data.get('color', 'N/A')
-            duration = data.get('duration', 0)
-            location = data.get('location', 'N/A')
-            
-            st.markdown(f"### 🚗 {vehicle}")
-            st.markdown(f"**Plate Number:** {plate}")
-            st.markdown(f"**Color:** {color}")
-            st.markdown(f"**⏱️ Duration:** {duration:.1f} minutes")
-            st.markdown(f"**📍 Location:** {location}")
-            
-            timestamp = data.get('timestamp')
-            if timestamp:
-                st.markdown(f"**🕐 Time:** {timestamp.strftime('%Y-%m-%d %H:%M:%S')}")
-        
+            page_size = st.selectbox("Cards per page", PAGE_SIZES, index=PAGE_SIZES.index(20), on_change=go_to_page, args=(0,))
+        page_count = max(1, -(-total // page_size))
+        # Resolves may have removed the page we were on
+        page = min(st.session_state.live_page, page_count - 1)
+        with col1:
+            st.markdown(f"### 🚨 {total} active violation{'s' if total != 1 else ''}")
         with col3:
-            st.markdown('<div class="badge badge-active" style="font-size: 1rem; padding: 0.5rem 1rem;">🔴 ACTIVE</div>', unsafe_allow_html=True)
-            st.markdown("<br>", unsafe_allow_html=True)
-            
-            if st.button("✅ Mark as Resolved", key=violation_id):
-                db.collection('violations').document(violation_id).update({
-                    'status': 'resolved',
-                    'resolved_at': datetime.now()
-                })
-                st.success("Violation marked as resolved!")
-                st.rerun()
-        
-        st.markdown('</div>', unsafe_allow_html=True)
-    
-    if not violations_found:
-        st.markdown("""
-            <div class="clean-card" style="text-align: center; padding: 3rem;">
-                <div style="font-size: 4rem; margin-bottom: 1rem;">✅</div>
-                <div style="font-size: 1.5rem; font-weight: 700; color: #10b981; margin-bottom: 0.5rem;">No Active Violations!</div>
-                <div style="font-size: 1rem; color: #6b7280;">All clear at this time. System is monitoring.</div>
-            </div>
-        """, unsafe_allow_html=True)
-        st.balloons()
+            st.session_state.live_jump = page + 1
+            st.number_input("Jump to page", min_value=1, max_value=page_count, step=1,
+                            key='live_jump', on_change=jump_to_page)
+    
+        start = page * page_size
+        count = page_size * (1 + st.session_state.live_extra_pages)
+        if matching is not None:
+            violations_list = matching[start:start + count]
+        elif store_live:
+            violations_list = store.window(start, count, camera_ids)
+        else:
+            violations_list = cameras.active_window(db, camera_ids, start, count)
+    
+        if bulk_mode:
+            selected = len(st.session_state.live_selected)
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.button("Select all on page", on_click=select, args=([v['id'] for v in violations_list],))
+            with col2:
+                st.button(f"Select all matching ({total})", on_click=select, args=([v['id'] for v in matching],))
+            with col3:
+                st.button("Clear selection", on_click=clear_selection, disabled=not selected)
+            with col4:
+                st.button(f"✅ Resolve selected ({selected})", on_click=resolve_selected, disabled=not selected)
+    
+        for data in violations_list:
+            render_violation(data, selectable=bulk_mode)
+    
+        # Window navigation
+        shown_to = start + len(violations_list)
+        if total > page_size:
+            st.markdown(f'<div style="text-align: center; color: #6b7280;">Showing {start + 1 if violations_list else 0}–{shown_to} of {total}</div>', unsafe_allow_html=True)
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                if page > 0:
+                    st.button("⬅️ Newer", on_click=go_to_page, args=(page - 1,))
+            with col2:
+                if shown_to < total:
+                    st.button("⬇️ Load more", on_click=load_more)
+            with col3:
+                if shown_to < total:
+                    st.button("Older ➡️", on_click=go_to_page, args=(shown_to // page_size,))
+    
+        if total == 0 and not bulk_mode:
+            st.markdown("""
+                <div class="clean-card" style="text-align: center; padding: 3rem;">
+                    <div style="font-size: 4rem; margin-bottom: 1rem;">✅</div>
+                    <div style="font-size: 1.5rem; font-weight: 700; color: #10b981; margin-bottom: 0.5rem;">No Active Violations!</div>
+                    <div style="font-size: 1rem; color: #6b7280;">All clear at this time. System is monitoring.</div>
+                </div>
+            """, unsafe_allow_html=True)
+            st.balloons()
         
-except Exception as e:
-    st.error(f"Error loading violations: {e}")
+    except Exception as e:
+        st.error(f"Error loading violations: {e}")
+
+
+st.fragment(live_list, run_every=None if store_live else refresh_interval)()
+
+if store_live and refresh_interval:
+    watch_store()
+
+metrics.end_rerun()
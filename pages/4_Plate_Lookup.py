@@ -0,0 +1,97 @@
+import streamlit as st
+import time
+
+from utils import bootstrap
+from utils import metrics
+from utils import plate_index
+from utils import theme
+from utils import violations as violations_data
+
+st.set_page_config(page_title="Plate Lookup", page_icon="🔎", layout="wide")
+metrics.begin_rerun("Plate Lookup")
+
+theme.apply()
+
+# Header
+st.markdown("""
+    <div class="header-container">
+        <div class="page-title">🔎 Plate Lookup</div>
+        <div class="page-subtitle">Full violation history of a plate number</div>
+    </div>
+""", unsafe_allow_html=True)
+metrics.painted()
+
+# Loaded once the header is on screen, so the page paints before pandas
+from utils import frames
+
+db = bootstrap.get_db()
+
+query = st.text_input(
+    "🔎 Plate number",
+    placeholder="Full plate, first characters or last digits, e.g. ABC 1234",
+    key="plate_query",
+)
+
+if query:
+    try:
+        index = plate_index.get_plate_index(db)
+        index.refresh()
+        started = time.perf_counter()
+        results = index.search(query)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        if not results:
+            st.info(f"No plate matches \"{query}\"")
+        else:
+            st.caption(f"{len(results)} matching plates in {elapsed_ms:.1f} ms · 0/O, 1/I, 8/B, 5/S and 2/Z are treated as the same character")
+            col1, col2 = st.columns([1, 2])
+
+            with col1:
+                st.markdown('<div class="section-header">🚗 Matches</div>', unsafe_allow_html=True)
+                by_plate = {result['plate']: result for result in results}
+                selected = st.radio(
+                    "Matches",
+                    list(by_plate),
+                    format_func=lambda plate: f"{plate} · {by_plate[plate]['total']} violations · {by_plate[plate]['match']}",
+                    label_visibility="collapsed",
+                    key="plate_selected",
+                )
+                variants = index.variants(selected)
+                include_variants = len(variants) > 1 and st.checkbox(
+                    f"Include {len(variants) - 1} likely misread(s): {', '.join(p for p in variants if p != selected)}",
+                    value=True,
+                )
+
+            with col2:
+                plates = tuple(variants) if include_variants else (selected,)
+                timeline = violations_data.get_plate_timeline(db, plates)
+                st.markdown(f'<div class="section-header">📋 History of {selected}</div>', unsafe_allow_html=True)
+
+                if not timeline:
+                    st.info("No violations recorded for this plate")
+                else:
+                    active = sum(1 for violation in timeline if violation.get('status') == 'active')
+                    first_seen = timeline[-1]['timestamp'].strftime('%Y-%m-%d')
+                    last_seen = timeline[0]['timestamp'].strftime('%Y-%m-%d %H:%M')
+                    boxes = st.columns(4)
+                    for box, value, label in zip(
+                        boxes,
+                        (len(timeline), active, first_seen, last_seen),
+                        ("Violations", "Active", "First Seen", "Last Seen"),
+                    ):
+                        with box:
+                            st.markdown(f"""
+                                <div class="metric-box">
+                                    <div class="metric-box-value" style="font-size: 1.25rem;">{value}</div>
+                                    <div class="metric-box-label">{label}</div>
+                                </div>
+                            """, unsafe_allow_html=True)
+
+                    st.markdown("<br>", unsafe_allow_html=True)
+                    df = frames.build_frame(timeline, violations_data.TIMELINE_FIELDS)
+                    st.dataframe(df, use_container_width=True, hide_index=True)
+
+    except Exception as e:
+        st.error(f"Error loading data: {e}")
+
+metrics.end_rerun()
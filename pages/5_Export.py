@@ -0,0 +1,81 @@
+import streamlit as st
+from datetime import datetime
+from pathlib import Path
+
+from utils import bootstrap
+from utils import cameras
+from utils import metrics
+from utils import theme
+
+st.set_page_config(page_title="Export", page_icon="📥", layout="wide")
+metrics.begin_rerun("Export")
+
+theme.apply()
+
+# Header
+st.markdown("""
+    <div class="header-container">
+        <div class="page-title">📥 Export Violations</div>
+        <div class="page-subtitle">Download every violation in a date range as CSV or Parquet</div>
+    </div>
+""", unsafe_allow_html=True)
+metrics.painted()
+
+# Loaded once the header is on screen, so the page paints before pyarrow
+from utils import export
+
+db = bootstrap.get_db()
+camera_ids = cameras.select(db)
+
+today = datetime.now().date()
+col1, col2 = st.columns([3, 1])
+with col1:
+    picked = st.date_input("📅 Date range", (today.replace(day=1), today), max_value=today)
+with col2:
+    file_format = st.radio("Format", list(export.FORMATS), horizontal=True)
+
+if len(picked) != 2:
+    st.info("Pick the last day of the range")
+else:
+    start_date, end_date = picked
+    if st.button("📥 Prepare export", type="primary"):
+        start_time = datetime.combine(start_date, datetime.min.time())
+        end_time = datetime.combine(end_date, datetime.max.time())
+        previous = st.session_state.pop("export_file", None)
+        if previous:
+            export.remove(previous['path'])
+        path = export.new_path(file_format)
+        try:
+            total = export.count(db, camera_ids, start_time, end_time)
+            bar = st.progress(0.0, text="Reading violations…")
+
+            def progress(written):
+                if total:
+                    bar.progress(min(written / total, 1.0), text=f"{written:,} of {total:,} violations written")
+                else:
+                    bar.progress(0.0, text=f"{written:,} violations written")
+
+            written = export.write(path, file_format, export.rows(db, camera_ids, start_time, end_time), progress)
+            bar.empty()
+            st.session_state["export_file"] = {
+                'path': path,
+                'file_name': export.file_name(file_format, start_date, end_date),
+                'mime': export.FORMATS[file_format][1],
+                'rows': written,
+            }
+        except Exception as e:
+            export.remove(path)
+            st.error(f"Error exporting data: {e}")
+
+    prepared = st.session_state.get("export_file")
+    if prepared and Path(prepared['path']).exists():
+        st.success(f"{prepared['rows']:,} violations ready in {prepared['file_name']}")
+        st.download_button(
+            f"⬇️ Download {prepared['file_name']}",
+            # Read from disk only when the button is clicked
+            data=Path(prepared['path']).read_bytes,
+            file_name=prepared['file_name'],
+            mime=prepared['mime'],
+        )
+
+metrics.end_rerun()
@@ -1,7 +1,17 @@
+import html
+
 import streamlit as st
-import firebase_admin
-from firebase_admin import credentials, firestore
-from datetime import datetime
+
+from utils import bootstrap
+from utils import cameras
+from utils import concurrency
+from utils import health
+from utils import metrics
+from utils import refresh
+from utils import rollups
+from utils import theme
+from utils import thumbnails
+from utils import violations as violations_data
 
 # Page configuration
 st.set_page_config(
@@ -10,378 +20,136 @@ st.set_page_config(
     layout="wide",
     initial_sidebar_state="expanded"
 )
+metrics.begin_rerun("Home")
 
-# Clean white design with minimal purple accents
-st.markdown("""
-    <style>
-    /* Import Google Font */
-    @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700;800&display=swap');
-    
-    /* Global Styles */
-    * {
-        font-family: 'Inter', sans-serif;
-    }
-    
-    /* Main background - WHITE */
-    .stApp {
-        background: #ffffff;
-    }
-    
-    /* Hide Streamlit elements */
-    #MainMenu {visibility: hidden;}
-    footer {visibility: hidden;}
-    .stDeployButton {display: none;}
-    
-    /* Main container */
-    .main .block-container {
-        padding-top: 2rem;
-        padding-bottom: 2rem;
-        max-width: 1200px;
-    }
-    
-    /* Header section - Dark Purple Gradient */
-    .header-container {
-        background: linear-gradient(135deg, #5b21b6 0%, #7c3aed 100%);
-        text-align: center;
-        padding: 3rem 2rem;
-        margin: -2rem -2rem 2rem -2rem;
-        border-radius: 0 0 24px 24px;
-    }
-    
-    .main-title {
-        font-size: 3rem;
-        font-weight: 800;
-        color: white;
-        margin-bottom: 0.5rem;
-        letter-spacing: -1px;
-    }
-    
-    .subtitle {
-        font-size: 1.2rem;
-        color: rgba(255, 255, 255, 0.95);
-        font-weight: 400;
-    }
-    
-    /* Clean white cards */
-    .clean-card {
-        background: white;
-        border-radius: 16px;
-        padding: 2rem;
-        box-shadow: 0 1px 3px rgba(0, 0, 0, 0.1);
-        margin-bottom: 1.5rem;
-        border: 1px solid #e5e7eb;
-        transition: all 0.3s ease;
-    }
-    
-    .clean-card:hover {
-        box-shadow: 0 4px 12px rgba(91, 33, 182, 0.1);
-        transform: translateY(-2px);
-        border-color: #c4b5fd;
-    }
-    
-    /* Status cards - White with purple border */
-    .status-card {
-        background: white;
-        border: 2px solid #e5e7eb;
-        border-radius: 16px;
-        padding: 2rem;
-        text-align: center;
-        transition: all 0.3s ease;
-        height: 100%;
-    }
-    
-    .status-card:hover {
-        border-color: #7c3aed;
-        box-shadow: 0 4px 12px rgba(124, 58, 237, 0.15);
-    }
-    
-    .status-icon {
-        font-size: 2.5rem;
-        margin-bottom: 1rem;
-    }
-    
-    .status-label {
-        font-size: 0.875rem;
-        color: #6b7280;
-        text-transform: uppercase;
-        letter-spacing: 0.5px;
-        font-weight: 600;
-        margin-bottom: 0.5rem;
-    }
-    
-    .status-value {
-        font-size: 2rem;
-        font-weight: 700;
-        color: #111827;
-        margin-bottom: 0.5rem;
-    }
-    
-    .status-text {
-        font-size: 0.875rem;
-        color: #7c3aed;
-        font-weight: 600;
-    }
-    
-    /* Status indicator dot */
-    .status-dot {
-        width: 12px;
-        height: 12px;
-        border-radius: 50%;
-        display: inline-block;
-        margin-right: 8px;
-        animation: pulse 2s infinite;
-    }
-    
-    .status-online {
-        background: #10b981;
-    }
-    
-    .status-offline {
-        background: #ef4444;
-    }
-    
-    @keyframes pulse {
-        0%, 100% {
-            opacity: 1;
-        }
-        50% {
-            opacity: 0.5;
-        }
-    }
-    
-    /* Section headers with purple accent */
-    .section-header {
-        font-size: 1.5rem;
-        font-weight: 700;
-        color: #111827;
-        margin-bottom: 1.5rem;
-        padding-bottom: 0.75rem;
-        border-bottom: 3px solid #7c3aed;
-        display: inline-block;
-    }
-    
-    /* Feature cards */
-    .feature-card {
-        background: white;
-        border: 1px solid #e5e7eb;
-        border-radius: 12px;
-        padding: 1.5rem;
-        margin-bottom: 1rem;
-        transition: all 0.2s ease;
-    }
-    
-    .feature-card:hover {
-        border-color: #c4b5fd;
-        box-shadow: 0 4px 8px rgba(124, 58, 237, 0.1);
-        transform: translateX(5px);
-    }
-    
-    .feature-icon {
-        font-size: 1.5rem;
-        margin-right: 1rem;
-    }
-    
-    .feature-title {
-        font-size: 1rem;
-        font-weight: 600;
-        color: #111827;
-        margin-bottom: 0.25rem;
-    }
-    
-    .feature-text {
-        font-size: 0.875rem;
-        color: #6b7280;
-    }
-    
-    /* Metrics - purple accent */
-    .metric-container {
-        text-align: center;
-        padding: 1.5rem;
-        background: white;
-        border-radius: 12px;
-        border: 2px solid #e5e7eb;
-        transition: all 0.3s ease;
-    }
-    
-    .metric-container:hover {
-        border-color: #7c3aed;
-        box-shadow: 0 4px 12px rgba(124, 58, 237, 0.15);
-    }
-    
-    .metric-value {
-        font-size: 2.5rem;
-        font-weight: 800;
-        color: #7c3aed;
-        line-height: 1;
-        margin-bottom: 0.5rem;
-    }
-    
-    .metric-label {
-        font-size: 0.875rem;
-        color: #6b7280;
-        font-weight: 600;
-        text-transform: uppercase;
-        letter-spacing: 0.5px;
-    }
-    
-    .metric-delta {
-        font-size: 0.75rem;
-        margin-top: 0.5rem;
-        font-weight: 600;
-    }
-    
-    /* Info box - light purple background */
-    .info-box {
-        background: #faf5ff;
-        border-left: 4px solid #7c3aed;
-        border-radius: 8px;
-        padding: 1rem;
-        margin: 1rem 0;
-        transition: all 0.2s ease;
-    }
-    
-    .info-box:hover {
-        background: #f3e8ff;
-    }
-    
-    .info-title {
-        font-weight: 600;
-        color: #5b21b6;
-        margin-bottom: 0.5rem;
-    }
-    
-    .info-text {
-        color: #4b5563;
-        font-size: 0.875rem;
-        line-height: 1.6;
-    }
-    
-    /* Badge */
-    .badge {
-        display: inline-block;
-        padding: 0.375rem 0.75rem;
-        border-radius: 9999px;
-        font-size: 0.75rem;
-        font-weight: 600;
-        text-transform: uppercase;
-        letter-spacing: 0.5px;
-    }
-    
-    .badge-active {
-        background: #fee2e2;
-        color: #dc2626;
-    }
-    
-    .badge-resolved {
-        background: #d1fae5;
-        color: #059669;
-    }
-    
-    /* Sidebar - Dark Purple */
-    [data-testid="stSidebar"] {
-        background: linear-gradient(180deg, #5b21b6 0%, #7c3aed 100%);
-    }
-    
-    [data-testid="stSidebar"] * {
-        color: white !important;
-    }
-    
-    /* Button styling */
-    .stButton>button {
-        background: #7c3aed;
-        color: white;
-        border: none;
-        border-radius: 8px;
-        padding: 0.5rem 1.5rem;
-        font-weight: 600;
-        transition: all 0.2s;
-        border: 2px solid #7c3aed;
-    }
-    
-    .stButton>button:hover {
-        background: #6d28d9;
-        box-shadow: 0 4px 12px rgba(124, 58, 237, 0.3);
-    }
-    
-    /* Divider */
-    hr {
-        border: none;
-        border-top: 2px solid #e5e7eb;
-        margin: 2rem 0;
-    }
-  
-""", unsafe_allow_html=True)
+theme.apply()
 
-# Initialize Firebase
-@st.cache_resource
-def init_firebase():
-    if not firebase_admin._apps:
-        cred = credentials.Certificate(dict(st.secrets["firebase"]))
-        firebase_admin.initialize_app(cred)
-    return firestore.client()
-
-try:
-    db = init_firebase()
-    firebase_connected = True
-except Exception as e:
-    firebase_connected = False
+# Live sections below rerun on their own at this interval
+refresh_interval = refresh.auto_refresh_interval()
 
 # Header - Only dark purple section
 st.markdown("""
-    <div class="header-container">
+    <div class="header-container hero">
         <div class="main-title">🚗 Smart Parking Enforcement</div>
         <div class="subtitle">AI-Powered Illegal Parking Detection System</div>
         <div class="subtitle">Barangay Tagapo, City of Santa Rosa, Laguna</div>
     </div>
 """, unsafe_allow_html=True)
+metrics.painted()
 
-# Status Cards - White with borders
-col1, col2, col3 = st.columns(3)
+# Initialize Firebase
+try:
+    db = bootstrap.get_db()
+    firebase_connected = True
+except Exception as e:
+    firebase_connected = False
 
-with col1:
-    st.markdown("""
-        <div class="status-card">
-            <div class="status-icon">📊</div>
-            <div class="status-label">Dashboard</div>
-            <div class="status-value"><span class="status-dot status-online"></span></div>
-            <div class="status-text">ONLINE</div>
-        </div>
-    """, unsafe_allow_html=True)
+camera_ids = cameras.select(db) if firebase_connected else None
 
-with col2:
-    if firebase_connected:
-        st.markdown("""
+# Start every section's reads now; each section below then waits only for its own
+if firebase_connected:
+    today = rollups.today()
+    if camera_ids is None:
+        concurrency.submit(violations_data.get_day_summary, db, today)
+    else:
+        concurrency.submit(cameras.day_rollup, db, camera_ids, today)
+    shown_ids = [camera['id'] for camera in cameras.shown(db, camera_ids)]
+    # Camera tiles are drawn only once a camera has sent a heartbeat
+    if shown_ids:
+        concurrency.submit(cameras.day_counts, db, shown_ids, today)
+        concurrency.submit(cameras.active_counts, db, shown_ids)
+    concurrency.submit(cameras.recent_violations, db, camera_ids, limit=3)
+
+# Status Cards - White with borders
+def status_cards():
+    col1, col2, col3 = st.columns(3)
+    
+    home = {row['page']: row for row in metrics.rerun_summary()}.get('Home')
+    load_text = f"Page load p50 {home['p50_ms']:.0f} ms" if home else "ONLINE"
+
+    with col1:
+        st.markdown(f"""
             <div class="status-card">
-                <div class="status-icon">🗄️</div>
-                <div class="status-label">Database</div>
+                <div class="status-icon">📊</div>
+                <div class="status-label">Dashboard</div>
                 <div class="status-value"><span class="status-dot status-online"></span></div>
-                <div class="status-text">CONNECTED</div>
+                <div class="status-text">{load_text}</div>
             </div>
         """, unsafe_allow_html=True)
-    else:
-        st.markdown("""
+
+    status = health.get_health(db) if firebase_connected else None
+    database = status['database'] if status else {'ok': False, 'error': 'Not initialized'}
+
+    with col2:
+        if database['ok']:
+            checked = health.format_age(health.age_seconds(database['checked_at']))
+            st.markdown(f"""
+                <div class="status-card">
+                    <div class="status-icon">🗄️</div>
+                    <div class="status-label">Database</div>
+                    <div class="status-value"><span class="status-dot status-online"></span></div>
+                    <div class="status-text">CONNECTED · {database['latency_ms']:.0f} ms</div>
+                    <div style="font-size: 0.75rem; color: #6b7280;">checked {checked}</div>
+                </div>
+            """, unsafe_allow_html=True)
+        else:
+            st.markdown(f"""
+                <div class="status-card">
+                    <div class="status-icon">🗄️</div>
+                    <div class="status-label">Database</div>
+                    <div class="status-value"><span class="status-dot status-offline"></span></div>
+                    <div class="status-text" style="color: #ef4444;">DISCONNECTED</div>
+                    <div style="font-size: 0.75rem; color: #6b7280;">{html.escape(database['error'] or '')[:120]}</div>
+                </div>
+            """, unsafe_allow_html=True)
+
+    with col3:
+        camera_rows = status['cameras'] if status else []
+        online = sum(1 for camera in camera_rows if health.is_online(camera))
+        if camera_rows:
+            seen = "<br>".join(
+                f"{'🟢' if health.is_online(camera) else '🔴'} {html.escape(camera['location'] or camera['id'])} · "
+                f"{health.format_age(health.age_seconds(camera['last_seen']))}"
+                for camera in camera_rows
+            )
+        else:
+            seen = "No heartbeats yet"
+        st.markdown(f"""
             <div class="status-card">
-                <div class="status-icon">🗄️</div>
-                <div class="status-label">Database</div>
-                <div class="status-value"><span class="status-dot status-offline"></span></div>
-                <div class="status-text" style="color: #ef4444;">DISCONNECTED</div>
+                <div class="status-icon">📹</div>
+                <div class="status-label">Active Cameras</div>
+                <div class="status-value">{online} / {len(camera_rows)}</div>
+                <div class="status-text">{seen}</div>
             </div>
         """, unsafe_allow_html=True)
 
-with col3:
-    st.markdown("""
-        <div class="status-card">
-            <div class="status-icon">📹</div>
-            <div class="status-label">Active Cameras</div>
-            <div class="status-value">1</div>
-            <div class="status-text">Brgy. Tagapo</div>
-        </div>
-    """, unsafe_allow_html=True)
+# The probe behind these cards is cached for every session, so refreshing them is cheap
+st.fragment(status_cards, run_every=refresh_interval)()
 
 st.markdown("<br>", unsafe_allow_html=True)
 
-# Quick Stats
+# Per-camera tiles; the cameras' counts are queried at the same time
+def camera_tiles():
+    shown = cameras.shown(db, camera_ids)
+    if not shown:
+        return
+    st.markdown('<div class="clean-card">', unsafe_allow_html=True)
+    st.markdown('<div class="section-header">📹 Cameras</div>', unsafe_allow_html=True)
+    try:
+        shown_ids = [camera['id'] for camera in shown]
+        today_counts = cameras.day_counts(db, shown_ids, rollups.today())
+        active = cameras.active_counts(db, shown_ids)
+        cameras.tiles(shown, {camera_id: f"{active[camera_id]} / {today_counts[camera_id]}" for camera_id in active}, "Active / Today")
+    except Exception:
+        st.info("Unable to load camera counts")
+    st.markdown('</div>', unsafe_allow_html=True)
+    st.markdown("<br>", unsafe_allow_html=True)
+
 if firebase_connected:
+    st.fragment(camera_tiles, run_every=refresh_interval)()
+
+# Quick Stats
+def todays_overview():
     st.markdown('<div class="clean-card">', unsafe_allow_html=True)
     st.markdown('<div class="section-header">📊 Today\'s Overview</div>', unsafe_allow_html=True)
     st.markdown("<br>", unsafe_allow_html=True)
@@ -389,14 +157,15 @@ if firebase_connected:
     col1, col2, col3, col4 = st.columns(4)
     
     try:
-        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        violations_ref = db.collection('violations').where('timestamp', '>=', today).stream()
-        violations_list = list(violations_ref)
+        if camera_ids is None:
+            overview = violations_data.get_day_summary(db, rollups.today())
+        else:
+            overview = rollups.summary(cameras.day_rollup(db, camera_ids, rollups.today()))
         
-        total = len(violations_list)
-        active = len([v for v in violations_list if v.to_dict().get('status') == 'active'])
-        resolved = total - active
-        avg_duration = sum([v.to_dict().get('duration', 0) for v in violations_list]) / total if total > 0 else 0
+        total = overview['total']
+        active = overview['active']
+        resolved = overview['resolved']
+        avg_duration = overview['avg_duration']
         
         with col1:
             st.markdown(f"""
@@ -468,6 +237,9 @@ if firebase_connected:
     
     st.markdown('</div>', unsafe_allow_html=True)
 
+if firebase_connected:
+    st.fragment(todays_overview, run_every=refresh_interval)()
+
 st.markdown("<br>", unsafe_allow_html=True)
 
 # About System
@@ -539,23 +311,23 @@ with col2:
     st.markdown('</div>', unsafe_allow_html=True)
 
 # Recent Violations
-if firebase_connected:
+def recent_violations():
     st.markdown('<div class="clean-card">', unsafe_allow_html=True)
     st.markdown('<div class="section-header">🚨 Recent Violations</div>', unsafe_allow_html=True)
     
     try:
-        recent_violations = db.collection('violations').order_by('timestamp', direction=firestore.Query.DESCENDING).limit(3).stream()
+        recent_violations = cameras.recent_violations(db, camera_ids, limit=3)
         
         violations_found = False
-        for violation in recent_violations:
+        for data in recent_violations:
             violations_found = True
-            data = violation.to_dict()
             
             col1, col2, col3 = st.columns([1, 3, 1])
             
             with col1:
                 if data.get('image_url'):
-                    st.image(data['image_url'], use_column_width=True)
+                    st.image(thumbnails.thumbnail(data['image_url'], 'small'), use_column_width=True)
+                    st.link_button("🔍 Full size", data['image_url'], use_container_width=True)
                 else:
                     st.markdown("""
                         <div style="background: #f9fafb; padding: 2rem; text-align: center; border-radius: 8px; border: 1px solid #e5e7eb;">
@@ -615,6 +387,9 @@ if firebase_connected:
     
     st.markdown('</div>', unsafe_allow_html=True)
 
+if firebase_connected:
+    st.fragment(recent_violations, run_every=refresh_interval)()
+
 # Footer
 st.markdown("<hr>", unsafe_allow_html=True)
 st.markdown("""
@@ -628,6 +403,8 @@ st.markdown("""
     </div>
 """, unsafe_allow_html=True)
 
+metrics.end_rerun()
+
 # Sidebar - Dark purple (only colored section)
 with st.sidebar:
     st.markdown("""
@@ -641,17 +418,43 @@ with st.sidebar:
             <div style="font-size: 0.875rem; line-height: 1.8;">
                 📊 <strong>Dashboard</strong>: Overview<br>
                 🚨 <strong>Live Violations</strong>: Active monitoring<br>
-                📈 <strong>Analytics</strong>: Trends & insights
+                📈 <strong>Analytics</strong>: Trends & insights<br>
+                🔎 <strong>Plate Lookup</strong>: Plate history
             </div>
         </div>
     """, unsafe_allow_html=True)
     
-    st.markdown("""
+    reruns = {row['page']: row for row in metrics.rerun_summary()}
+    home = reruns.get('Home', {})
+    status = health.get_health(db) if firebase_connected else None
+    if status and status['database']['ok'] and all(health.is_online(camera) for camera in status['cameras']):
+        overall = "✅ All systems operational"
+    elif status and status['database']['ok']:
+        overall = "⚠️ Some cameras are offline"
+    else:
+        overall = "❌ Database unreachable"
+    st.markdown(f"""
         <div style="background: rgba(255,255,255,0.1); padding: 1rem; border-radius: 8px;">
             <div style="font-weight: 600; margin-bottom: 0.5rem;">⚡ System Status</div>
             <div style="font-size: 0.875rem;">
-                ✅ All systems operational<br>
-                📊 Uptime: 99.9%
+                {overall}<br>
+                ⏱️ Page load: p50 {home.get('p50_ms', 0):.0f} ms · p95 {home.get('p95_ms', 0):.0f} ms
             </div>
         </div>
     """, unsafe_allow_html=True)
+    
+    with st.expander("📈 Query metrics"):
+        cold = metrics.cold_start()
+        if cold:
+            paint_ok = cold['first_paint_ms'] is not None and cold['first_paint_ms'] <= bootstrap.FIRST_PAINT_TARGET_MS
+            total_ok = cold['total_ms'] <= bootstrap.COLD_START_TARGET_MS
+            st.caption(
+                f"Cold start ({cold['page']}): first paint {cold['first_paint_ms'] or 0:.0f} ms "
+                f"{'✅' if paint_ok else '⚠️'} target {bootstrap.FIRST_PAINT_TARGET_MS} ms · "
+                f"loaded {cold['total_ms']:.0f} ms {'✅' if total_ok else '⚠️'} target {bootstrap.COLD_START_TARGET_MS} ms"
+            )
+        # Tables load pandas, which the home page otherwise doesn't need
+        if st.toggle("Show tables"):
+            st.dataframe(list(reruns.values()), hide_index=True, use_container_width=True)
+            st.dataframe(metrics.query_summary(), hide_index=True, use_container_width=True)
+        st.download_button("⬇️ Export metrics", metrics.export(), file_name="metrics.json", mime="application/json")
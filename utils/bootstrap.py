@@ -0,0 +1,31 @@
+"""Firestore client shared by every page.
+
+Streamlit keeps ``cache_resource`` values for the life of the server process,
+so the credentials are read from ``st.secrets`` and the Firebase app is
+initialized once, by the first page anyone opens. Pages draw their header
+before asking for the client, and import pandas, pyarrow and plotly only if
+they draw tables or charts, so a container that has just woken up paints the
+home page without loading them. The Firestore library is imported only here
+and inside the ``utils`` functions that need its query constants and field
+transforms, so it loads with the client, after the header.
+"""
+import streamlit as st
+
+# Every page imports this module before the rest of ``utils``, so the metrics
+# clock for the cold start begins before the app's other modules load
+from utils import metrics  # noqa: F401
+
+# Targets for the first visit after the container wakes up, checked by
+# ``python -m benchmarks.cold_start`` and shown in the home page sidebar
+FIRST_PAINT_TARGET_MS = 1000
+COLD_START_TARGET_MS = 3000
+
+
+@st.cache_resource(show_spinner=False)
+def get_db():
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
+    if not firebase_admin._apps:
+        firebase_admin.initialize_app(credentials.Certificate(dict(st.secrets["firebase"])))
+    return firestore.client()
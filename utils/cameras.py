@@ -0,0 +1,154 @@
+"""Cameras, the camera picker, and queries that span several cameras.
+
+Each detector tags its violations with ``camera_id``, the id its heartbeats
+are stored under (see ``utils/health.py``), so the camera list comes from the
+cached health probe at no extra read. A view of several cameras runs the
+per-camera query for each of them on its own thread and merges the results
+by timestamp: the page waits for the slowest camera, not for all of them in
+turn. With no cameras picked, pages keep the single unfiltered query, which
+also covers violations recorded before cameras were tagged.
+"""
+import heapq
+import html
+import itertools
+import threading
+from datetime import datetime
+
+import streamlit as st
+
+from utils import concurrency
+from utils import health
+from utils import rollups
+from utils import violations as violations_data
+
+# Survives moving between pages, unlike the picker's own widget state
+SELECTION_KEY = 'camera_selection'
+TILES_PER_ROW = 4
+
+
+def get_cameras(db):
+    """``[{'id', 'location', 'last_seen'}]`` for every camera that has sent a heartbeat."""
+    return health.get_health(db)['cameras']
+
+
+def label(camera):
+    return f"{camera['location']} ({camera['id']})" if camera['location'] else camera['id']
+
+
+def select(db):
+    """Sidebar camera picker; the picked camera ids, or None for all cameras."""
+    cameras = get_cameras(db)
+    if len(cameras) < 2:
+        return None
+    labels = {camera['id']: label(camera) for camera in cameras}
+    picked = st.sidebar.multiselect(
+        "📹 Cameras",
+        list(labels),
+        default=[camera_id for camera_id in st.session_state.get(SELECTION_KEY, []) if camera_id in labels],
+        format_func=labels.get,
+        placeholder="All cameras",
+    )
+    st.session_state[SELECTION_KEY] = picked
+    return picked or None
+
+
+def shown(db, camera_ids):
+    """The cameras a view covers: the picked ones, or every camera."""
+    cameras = get_cameras(db)
+    return [camera for camera in cameras if camera_ids is None or camera['id'] in camera_ids]
+
+
+def fan_out(fn, camera_ids):
+    """``{camera_id: fn(camera_id)}``, with the calls for different cameras running at the same time."""
+    if len(camera_ids) == 1:
+        return {camera_ids[0]: fn(camera_ids[0])}
+    results = {}
+    errors = []
+
+    def run(camera_id):
+        try:
+            results[camera_id] = fn(camera_id)
+        except Exception as e:
+            errors.append(e)
+
+    # Threads of its own rather than the shared pool, which may be what
+    # called this
+    run = concurrency.bind(run)
+    threads = [threading.Thread(target=run, args=(camera_id,)) for camera_id in camera_ids]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    return {camera_id: results[camera_id] for camera_id in camera_ids}
+
+
+def merge_by_timestamp(lists, newest_first=False):
+    """Merge lists that are each sorted by ``timestamp`` into one sorted list."""
+    return list(heapq.merge(*lists, key=lambda violation: (violation['timestamp'], violation['id']), reverse=newest_first))
+
+
+def recent_violations(db, camera_ids, limit=3):
+    if camera_ids is None:
+        return violations_data.get_recent_violations(db, limit=limit)
+    per_camera = fan_out(lambda camera: violations_data.get_recent_violations(db, limit=limit, camera=camera), camera_ids)
+    return merge_by_timestamp(per_camera.values(), newest_first=True)[:limit]
+
+
+def active_window(db, camera_ids, start, count):
+    """Same contract as ``violations.get_active_violations_window``, over the picked cameras."""
+    if camera_ids is None:
+        return violations_data.get_active_violations_window(db, start, count)
+    # Any of the cameras could fill the whole window
+    per_camera = fan_out(
+        lambda camera: violations_data.get_active_violations_window(db, 0, start + count, camera=camera), camera_ids
+    )
+    return list(itertools.islice(merge_by_timestamp(per_camera.values(), newest_first=True), start, start + count))
+
+
+def active_counts(db, camera_ids):
+    """``{camera_id: number of active violations}``."""
+    return fan_out(lambda camera: violations_data.count_active_violations(db, camera=camera), camera_ids)
+
+
+def day_counts(db, camera_ids, day):
+    """``{camera_id: number of violations on day}``."""
+    return fan_out(lambda camera: violations_data.count_day_violations(db, day, camera=camera), camera_ids)
+
+
+def violations_between(db, camera_ids, start_time, end_time, fields):
+    if camera_ids is None:
+        return violations_data.get_violations_between(db, start_time, end_time, fields)
+    per_camera = fan_out(
+        lambda camera: violations_data.get_violations_between(db, start_time, end_time, fields, camera=camera), camera_ids
+    )
+    return merge_by_timestamp(per_camera.values())
+
+
+def day_rollup(db, camera_ids, day):
+    """The day's rollup bucket; for picked cameras, counted from their violations."""
+    if camera_ids is None:
+        return violations_data.get_daily_rollups(db, day, day)[0]
+    start_time = datetime.combine(day, datetime.min.time())
+    end_time = datetime.combine(day, datetime.max.time())
+    violations = violations_between(db, camera_ids, start_time, end_time, violations_data.ROLLUP_FIELDS)
+    return rollups.build_days(violations, [day])[rollups.day_key(day)]
+
+
+def tiles(cameras, values, caption):
+    """One tile per camera with its heartbeat status and ``values[camera_id]`` over ``caption``."""
+    for start in range(0, len(cameras), TILES_PER_ROW):
+        for column, camera in zip(st.columns(TILES_PER_ROW), cameras[start:start + TILES_PER_ROW]):
+            online = health.is_online(camera)
+            with column:
+                st.markdown(f"""
+                    <div class="metric-box">
+                        <div class="metric-box-value">{values.get(camera['id'], 0)}</div>
+                        <div class="metric-box-label">{caption}</div>
+                        <div style="font-size: 0.8rem; color: #6b7280; margin-top: 0.5rem;">
+                            <span class="status-dot {'status-online' if online else 'status-offline'}"></span>
+                            {html.escape(label(camera))} · {health.format_age(health.age_seconds(camera['last_seen']))}
+                        </div>
+                    </div>
+                """, unsafe_allow_html=True)
@@ -0,0 +1,92 @@
+"""Analytics figures that stay the same size however long the date range.
+
+Counts are binned here, before they reach Plotly: a range is shown per day,
+week, month or year, whichever is the finest that fits in ``MAX_POINTS``
+points, so five years send about as much to the browser as a quarter. The
+trend is a WebGL line (``Scattergl``), which draws in about the same time
+whatever it holds. The hourly bars and the vehicle type pie have at most 24
+and a handful of points, so they stay ordinary SVG traces.
+"""
+from datetime import date, timedelta
+
+import plotly.express as px
+import plotly.graph_objects as go
+
+MAX_POINTS = 120
+GRANULARITIES = ('day', 'week', 'month', 'year')
+COLOR = '#7c3aed'
+
+
+def period_start(day, granularity):
+    """First day of the ``granularity`` period holding ``day`` (weeks start on Monday)."""
+    if granularity == 'day':
+        return day
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day.replace(month=1, day=1)
+
+
+def periods(start_date, end_date, granularity):
+    """Number of ``granularity`` periods from ``start_date`` to ``end_date``."""
+    if granularity == 'day':
+        return (end_date - start_date).days + 1
+    if granularity == 'week':
+        return (period_start(end_date, 'week') - period_start(start_date, 'week')).days // 7 + 1
+    if granularity == 'month':
+        return (end_date.year - start_date.year) * 12 + end_date.month - start_date.month + 1
+    return end_date.year - start_date.year + 1
+
+
+def granularity(start_date, end_date, max_points=MAX_POINTS):
+    """The finest granularity that shows the range in at most ``max_points`` points."""
+    for name in GRANULARITIES[:-1]:
+        if periods(start_date, end_date, name) <= max_points:
+            return name
+    return GRANULARITIES[-1]
+
+
+def bin_days(days, granularity):
+    """``(period starts, counts)`` from daily rollup documents, leaving out empty periods."""
+    counts = {}
+    for day in days:
+        if day['total']:
+            start = period_start(date.fromisoformat(day['date']), granularity)
+            counts[start] = counts.get(start, 0) + day['total']
+    starts = sorted(counts)
+    return starts, [counts[start] for start in starts]
+
+
+def trend(days, start_date, end_date):
+    """Violations over time from the range's daily rollups."""
+    grain = granularity(start_date, end_date)
+    x, y = bin_days(days, grain)
+    fig = go.Figure(go.Scattergl(
+        x=x, y=y, mode='lines+markers', line=dict(color=COLOR), marker=dict(size=8, color=COLOR),
+        hovertemplate=f'{grain}=%{{x}}<br>count=%{{y}}<extra></extra>',
+    ))
+    fig.update_layout(
+        title=f'Violations per {grain.title()}', xaxis_title=grain, yaxis_title='count',
+        plot_bgcolor='white', paper_bgcolor='white',
+    )
+    return fig
+
+
+def hourly(hours):
+    """Violations by hour of day from a combined rollup's ``hours`` map."""
+    hours = sorted((int(hour), bucket['total']) for hour, bucket in hours.items() if bucket['total'])
+    fig = px.bar(x=[hour for hour, _ in hours], y=[count for _, count in hours], title='Violations by Hour of Day',
+                 labels={'x': 'hour', 'y': 'count'})
+    fig.update_traces(marker_color=COLOR)
+    fig.update_layout(plot_bgcolor='white', paper_bgcolor='white')
+    return fig
+
+
+def vehicle_types(counts):
+    """Pie of violations by vehicle type from a combined rollup's ``vehicle_type`` map."""
+    counts = sorted(((vtype, count) for vtype, count in counts.items() if count), key=lambda item: -item[1])
+    fig = px.pie(values=[count for _, count in counts], names=[vtype for vtype, _ in counts], title='By Vehicle Type',
+                 hole=0.4)
+    fig.update_traces(marker=dict(colors=[COLOR, '#a78bfa', '#c4b5fd']))
+    return fig
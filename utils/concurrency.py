@@ -0,0 +1,70 @@
+"""Run a page's independent reads at the same time.
+
+A page ``submit``s each section's reads before drawing anything, then draws
+its sections in order. The sections call the same cached queries as before:
+Streamlit lets a call wait for an identical one that is already running
+instead of repeating it, so each section waits only for its own reads and
+the page takes as long as the slowest read rather than the sum of them.
+
+Work on other threads runs with the submitting rerun's Streamlit context,
+which the query caches look for, and a copy of its context variables, so
+``utils.metrics`` files the reads under the page that asked for them.
+"""
+import contextvars
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from streamlit.runtime.scriptrunner import add_script_run_ctx
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+# Shared by every session; reads spend their time waiting on the network
+MAX_WORKERS = 16
+
+_pool = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='queries')
+_on_pool = threading.local()
+
+
+def bind(fn):
+    """``fn`` wrapped to run on any thread as if called from the current rerun."""
+    ctx = get_script_run_ctx(suppress_warning=True)
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        thread = threading.current_thread()
+        previous = get_script_run_ctx(suppress_warning=True)
+        if ctx is not None:
+            add_script_run_ctx(thread, ctx)
+        try:
+            # A context can only be entered by one thread at a time
+            return context.copy().run(fn, *args, **kwargs)
+        finally:
+            # Streamlit has no way to detach a context, so a thread that had
+            # none keeps this one until it is next bound
+            if previous is not None:
+                add_script_run_ctx(thread, previous)
+
+    return run
+
+
+def _pooled(fn, *args, **kwargs):
+    _on_pool.active = True
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        _on_pool.active = False
+
+
+def submit(fn, *args, **kwargs):
+    """Start ``fn(*args, **kwargs)`` on the shared pool; returns its ``Future``.
+
+    Called from a pool thread, it runs right away instead, so work that
+    submits more work can't take every thread and wait on itself.
+    """
+    if getattr(_on_pool, 'active', False):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+    return _pool.submit(_pooled, bind(fn), *args, **kwargs)
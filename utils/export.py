@@ -0,0 +1,152 @@
+"""Violation exports as CSV or Parquet files.
+
+An export reads its range from Firestore a page at a time with cursors (see
+``violations.page_violations_between``) and appends every ``CHUNK_SIZE``
+rows to the file on disk (a row group, in Parquet), so memory stays at about
+one page and one chunk however long the range is. With cameras picked, each
+camera is paged separately and the pages are merged by timestamp as they
+arrive.
+
+Finished files stay in ``EXPORT_DIR`` until the session makes another
+export or they are ``MAX_AGE`` old. The download button reads the file only
+when the user clicks it (Streamlit 1.52 and later take a callable as
+``data``); Streamlit then holds that one file in memory while sending it.
+"""
+import heapq
+import os
+import tempfile
+import time
+import uuid
+from datetime import timezone
+
+import pyarrow as pa
+from pyarrow import csv
+from pyarrow import parquet
+
+from utils import violations as violations_data
+
+EXPORT_DIR = os.path.join(tempfile.gettempdir(), 'violation-exports')
+CHUNK_SIZE = 5000
+# Seconds a finished export is kept for download
+MAX_AGE = 24 * 3600
+
+EXPORT_FIELDS = ('timestamp', 'camera_id', 'location', 'vehicle_type', 'color', 'plate_number', 'duration', 'status',
+                 'resolved_at', 'image_url')
+SCHEMA = pa.schema([
+    ('id', pa.string()),
+    ('timestamp', pa.timestamp('us', tz='UTC')),
+    ('camera_id', pa.string()),
+    ('location', pa.string()),
+    ('vehicle_type', pa.string()),
+    ('color', pa.string()),
+    ('plate_number', pa.string()),
+    ('duration', pa.float64()),
+    ('status', pa.string()),
+    ('resolved_at', pa.timestamp('us', tz='UTC')),
+    ('image_url', pa.string()),
+])
+
+# Format name -> (file extension, MIME type)
+FORMATS = {
+    'CSV': ('csv', 'text/csv'),
+    'Parquet': ('parquet', 'application/vnd.apache.parquet'),
+}
+
+
+def _aware(value):
+    # The client library stores naive datetimes as UTC
+    return value.replace(tzinfo=timezone.utc) if value is not None and not value.tzinfo else value
+
+
+def rows(db, camera_ids, start_time, end_time):
+    """Violations in the range, oldest first, as dicts holding ``SCHEMA``'s fields."""
+    if camera_ids is None:
+        streams = [violations_data.page_violations_between(db, start_time, end_time, EXPORT_FIELDS)]
+    else:
+        streams = [
+            violations_data.page_violations_between(db, start_time, end_time, EXPORT_FIELDS, camera=camera)
+            for camera in camera_ids
+        ]
+    for violation in heapq.merge(*streams, key=lambda violation: (_aware(violation['timestamp']), violation['id'])):
+        row = {field: violation.get(field) for field in SCHEMA.names}
+        row['timestamp'] = _aware(row['timestamp'])
+        row['resolved_at'] = _aware(row['resolved_at'])
+        yield row
+
+
+def count(db, camera_ids, start_time, end_time):
+    """Violations an export of the range will hold, for progress; None if unknown."""
+    counts = [
+        violations_data.count_violations_between(db, start_time, end_time, camera)
+        for camera in (camera_ids or [None])
+    ]
+    return None if None in counts else sum(counts)
+
+
+class _Writer:
+    def __init__(self, path, file_format):
+        if file_format == 'CSV':
+            self._writer = csv.CSVWriter(path, SCHEMA)
+        else:
+            self._writer = parquet.ParquetWriter(path, SCHEMA)
+
+    def write(self, chunk):
+        self._writer.write_table(pa.Table.from_pylist(chunk, schema=SCHEMA))
+
+    def close(self):
+        self._writer.close()
+
+
+def write(path, file_format, violations, progress=None):
+    """Write ``violations`` to ``path`` in ``CHUNK_SIZE`` pieces; returns the number written.
+
+    ``progress(written)`` is called after each chunk.
+    """
+    writer = _Writer(path, file_format)
+    written = 0
+    try:
+        chunk = []
+        for violation in violations:
+            chunk.append(violation)
+            if len(chunk) == CHUNK_SIZE:
+                writer.write(chunk)
+                written += len(chunk)
+                chunk = []
+                if progress is not None:
+                    progress(written)
+        if chunk:
+            writer.write(chunk)
+            written += len(chunk)
+    finally:
+        writer.close()
+    if progress is not None:
+        progress(written)
+    return written
+
+
+def file_name(file_format, start_date, end_date):
+    extension = FORMATS[file_format][0]
+    if start_date == end_date:
+        return f'violations-{start_date:%Y-%m-%d}.{extension}'
+    return f'violations-{start_date:%Y-%m-%d}-to-{end_date:%Y-%m-%d}.{extension}'
+
+
+def new_path(file_format):
+    """A fresh file in ``EXPORT_DIR``, after removing exports older than ``MAX_AGE``."""
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    for name in os.listdir(EXPORT_DIR):
+        path = os.path.join(EXPORT_DIR, name)
+        try:
+            if time.time() - os.path.getmtime(path) > MAX_AGE:
+                os.remove(path)
+        except FileNotFoundError:
+            # Removed by another session at the same time
+            pass
+    return os.path.join(EXPORT_DIR, f'{uuid.uuid4().hex}.{FORMATS[file_format][0]}')
+
+
+def remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
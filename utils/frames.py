@@ -0,0 +1,126 @@
+"""Compact pandas DataFrames built straight from violation documents.
+
+``pd.DataFrame(list_of_dicts)`` keeps every string as a Python object and
+every timestamp as a ``datetime``, which costs several hundred bytes per row.
+``FrameBuilder`` appends each document's fields to typed buffers instead:
+timestamps as int64 microseconds, durations as float32, and repeating strings
+(vehicle type, plate, status, ...) as integer category codes. Documents can
+be fed from a stream, so the dicts never have to be held all at once.
+"""
+import array
+import math
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+TIME_FIELDS = ('timestamp', 'resolved_at')
+FLOAT_FIELDS = ('duration',)
+CATEGORY_FIELDS = ('vehicle_type', 'plate_number', 'status', 'location', 'color', 'camera_id')
+
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_UTC = _EPOCH.replace(tzinfo=timezone.utc)
+_NAT = np.iinfo(np.int64).min
+
+_MICROS_PER_HOUR = 3_600_000_000
+_MICROS_PER_DAY = 24 * _MICROS_PER_HOUR
+
+
+def _micros(value):
+    # Naive datetimes are UTC, as in Firestore
+    delta = value - (_EPOCH_UTC if value.tzinfo else _EPOCH)
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+class FrameBuilder:
+    def __init__(self, fields):
+        self.fields = tuple(fields)
+        self.rows = 0
+        self._columns = {}
+        self._categories = {}
+        self._appenders = []
+        for field in self.fields:
+            if field in TIME_FIELDS:
+                column = array.array('q')
+                append = self._time_appender(column)
+            elif field in FLOAT_FIELDS:
+                column = array.array('f')
+                append = self._float_appender(column)
+            elif field in CATEGORY_FIELDS:
+                column = array.array('i')
+                self._categories[field] = {}
+                append = self._category_appender(column, self._categories[field])
+            else:
+                column = []
+                append = column.append
+            self._columns[field] = column
+            self._appenders.append((field, append))
+
+    @staticmethod
+    def _time_appender(column):
+        def append(value):
+            column.append(_NAT if value is None else _micros(value))
+        return append
+
+    @staticmethod
+    def _float_appender(column):
+        def append(value):
+            column.append(math.nan if value is None else value)
+        return append
+
+    @staticmethod
+    def _category_appender(column, codes):
+        def append(value):
+            column.append(-1 if value is None else codes.setdefault(value, len(codes)))
+        return append
+
+    def add(self, row):
+        get = row.get
+        for field, append in self._appenders:
+            append(get(field))
+        self.rows += 1
+
+    def extend(self, rows):
+        for row in rows:
+            self.add(row)
+        return self
+
+    def build(self):
+        """The DataFrame; call once, after the last ``add``."""
+        data = {}
+        for field, column in self._columns.items():
+            if field in TIME_FIELDS:
+                micros = np.frombuffer(column, dtype=np.int64) if self.rows else np.empty(0, dtype=np.int64)
+                data[field] = pd.Series(micros.view('datetime64[us]')).dt.tz_localize('UTC')
+            elif field in FLOAT_FIELDS:
+                data[field] = np.frombuffer(column, dtype=np.float32) if self.rows else np.empty(0, dtype=np.float32)
+            elif field in CATEGORY_FIELDS:
+                codes = np.frombuffer(column, dtype=np.int32) if self.rows else np.empty(0, dtype=np.int32)
+                data[field] = pd.Categorical.from_codes(codes, categories=list(self._categories[field]))
+            else:
+                data[field] = pd.Series(column, dtype=object)
+        return pd.DataFrame(data, columns=list(self.fields))
+
+
+def build_frame(rows, fields):
+    """Compact DataFrame with ``fields`` as columns from an iterable of violation dicts."""
+    return FrameBuilder(fields).extend(rows).build()
+
+
+def add_time_parts(df, column='timestamp'):
+    """Add UTC ``date``, ``hour`` and ``weekday`` (Monday is 0) columns in one pass over ``column``.
+
+    Rows must all have a timestamp.
+    """
+    micros = df[column].dt.tz_convert('UTC').to_numpy(dtype='datetime64[us]').view(np.int64)
+    days = micros // _MICROS_PER_DAY
+    df['date'] = days.astype('datetime64[D]')
+    df['hour'] = (micros // _MICROS_PER_HOUR % 24).astype(np.int8)
+    # 1970-01-01 was a Thursday
+    df['weekday'] = ((days + 3) % 7).astype(np.int8)
+    return df
+
+
+def footprint(df):
+    """Bytes held by ``df``, including the strings behind object and category columns."""
+    return int(df.memory_usage(index=True, deep=True).sum())
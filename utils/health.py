@@ -0,0 +1,92 @@
+"""Health of the database and the cameras, probed at most once per ``HEALTH_TTL``.
+
+Each detector writes a heartbeat document (id = camera id, the ``camera_id``
+its violations carry) to ``camera_heartbeats`` every ``HEARTBEAT_INTERVAL``
+seconds with ``beat()``.
+``get_health`` reads those documents in one query. The same query's round
+trip is the database probe, so a check costs one read per camera. The
+result is cached for every session, so the status cards never add a query
+to each rerun. Ages are worked out when the cards are drawn, so they keep
+counting up between probes.
+"""
+import time
+from datetime import datetime, timezone
+
+import streamlit as st
+
+from utils import metrics
+
+HEARTBEAT_COLLECTION = 'camera_heartbeats'
+HEARTBEAT_INTERVAL = 60
+# A camera that missed this many heartbeats is shown offline
+STALE_AFTER = 3 * HEARTBEAT_INTERVAL
+
+HEALTH_TTL = 15
+
+
+def beat(db, camera_id, location=None):
+    """Called by a detector to say it is alive."""
+    from firebase_admin import firestore
+
+    heartbeat = {'last_seen': firestore.SERVER_TIMESTAMP}
+    if location is not None:
+        heartbeat['location'] = location
+    db.collection(HEARTBEAT_COLLECTION).document(camera_id).set(heartbeat, merge=True)
+
+
+@st.cache_data(ttl=HEALTH_TTL, show_spinner=False)
+def get_health(_db):
+    """``{'database': {...}, 'cameras': [...]}`` from one heartbeat query.
+
+    ``database`` has ``ok``, ``latency_ms``, ``checked_at`` and ``error``.
+    Each camera has ``id``, ``location`` and ``last_seen``. A failed probe
+    is cached like a successful one, so an outage doesn't turn into a retry
+    on every rerun.
+    """
+    checked_at = datetime.now(timezone.utc)
+    started = time.perf_counter()
+    try:
+        with metrics.track('health probe') as recorder:
+            cameras = []
+            for doc in _db.collection(HEARTBEAT_COLLECTION).stream():
+                data = doc.to_dict()
+                recorder.add(data)
+                cameras.append({'id': doc.id, 'location': data.get('location'), 'last_seen': data.get('last_seen')})
+            if not cameras:
+                recorder.reads(1)
+    except Exception as e:
+        return {
+            'database': {'ok': False, 'latency_ms': None, 'checked_at': checked_at, 'error': str(e)},
+            'cameras': [],
+        }
+    latency_ms = (time.perf_counter() - started) * 1000
+    return {
+        'database': {'ok': True, 'latency_ms': latency_ms, 'checked_at': checked_at, 'error': None},
+        'cameras': sorted(cameras, key=lambda camera: camera['id']),
+    }
+
+
+def age_seconds(timestamp):
+    """Seconds since ``timestamp``, or None if there isn't one."""
+    if timestamp is None:
+        return None
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return max(0.0, (datetime.now(timezone.utc) - timestamp).total_seconds())
+
+
+def is_online(camera):
+    age = age_seconds(camera['last_seen'])
+    return age is not None and age <= STALE_AFTER
+
+
+def format_age(seconds):
+    if seconds is None:
+        return 'never'
+    if seconds < 60:
+        return f'{seconds:.0f}s ago'
+    if seconds < 3600:
+        return f'{seconds / 60:.0f}m ago'
+    if seconds < 86400:
+        return f'{seconds / 3600:.0f}h ago'
+    return f'{seconds / 86400:.0f}d ago'
@@ -0,0 +1,203 @@
+"""Local, day-partitioned copy of violation history in Arrow files.
+
+Past days hardly ever change, so Analytics shouldn't download them again on
+every visit. ``HistoryCache`` keeps one uncompressed Arrow IPC file per UTC
+day on disk and reads them back memory-mapped, so loading a year is a few
+hundred file opens rather than a few hundred thousand document reads.
+
+The cache covers every day from ``covered_from`` onwards. A sync downloads
+only violations with a ``timestamp`` after the stored watermark, plus any
+violation whose ``resolved_at`` is after a second watermark, and upserts
+them into their day files. Both watermarks are the newest values seen on the
+server, re-read with ``LATE_GRACE`` of overlap for detectors that upload a
+little late. Asking for days before ``covered_from`` backfills them once,
+a day at a time.
+
+Violations deleted from Firestore stay in the cache; delete ``CACHE_DIR`` to
+rebuild it from scratch.
+"""
+import collections
+import itertools
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import streamlit as st
+from pyarrow import feather
+
+from utils import frames
+from utils import rollups
+from utils import violations as violations_data
+
+CACHE_DIR = os.path.join(tempfile.gettempdir(), 'violation-history')
+STATE_FILE = 'state.json'
+
+# How often a read may trigger a sync, in seconds
+SYNC_INTERVAL = violations_data.TODAY_TTL
+LATE_GRACE = timedelta(minutes=10)
+
+HISTORY_FIELDS = ('timestamp', 'vehicle_type', 'plate_number', 'duration', 'status', 'resolved_at')
+SCHEMA = pa.schema([
+    ('id', pa.string()),
+    ('timestamp', pa.timestamp('us', tz='UTC')),
+    ('vehicle_type', pa.dictionary(pa.int32(), pa.string())),
+    ('plate_number', pa.dictionary(pa.int32(), pa.string())),
+    ('duration', pa.float32()),
+    ('status', pa.dictionary(pa.int32(), pa.string())),
+    ('resolved_at', pa.timestamp('us', tz='UTC')),
+])
+# Bump when SCHEMA changes; files written in another format are dropped
+FORMAT_VERSION = 2
+
+
+def _aware(value):
+    # The client library stores naive datetimes as UTC
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def _latest(rows, field, current):
+    values = [_aware(row[field]) for row in rows if row.get(field) is not None]
+    if current is not None:
+        values.append(current)
+    return max(values) if values else None
+
+
+class HistoryCache:
+    def __init__(self, db, directory=CACHE_DIR):
+        os.makedirs(directory, exist_ok=True)
+        self.db = db
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._last_sync = 0.0
+        self._state = self._read_state()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.arrow')
+
+    def _read_state(self):
+        try:
+            with open(os.path.join(self.directory, STATE_FILE)) as f:
+                state = json.load(f)
+        except (FileNotFoundError, ValueError):
+            state = {}
+        if state.get('version') != FORMAT_VERSION:
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith('.arrow'):
+                    os.remove(entry.path)
+            return {'covered_from': None, 'watermark': None, 'resolved_watermark': None}
+        return {
+            'covered_from': state['covered_from'] and date.fromisoformat(state['covered_from']),
+            'watermark': state['watermark'] and datetime.fromisoformat(state['watermark']),
+            'resolved_watermark': state['resolved_watermark'] and datetime.fromisoformat(state['resolved_watermark']),
+        }
+
+    def _write_state(self):
+        path = os.path.join(self.directory, STATE_FILE)
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w') as f:
+            state = {key: value and value.isoformat() for key, value in self._state.items()}
+            json.dump(dict(state, version=FORMAT_VERSION), f)
+        os.replace(tmp_path, path)
+
+    def _read_day(self, key, columns=None):
+        try:
+            return feather.read_table(self._path(key), columns=columns, memory_map=True)
+        except FileNotFoundError:
+            return None
+
+    def _write_day(self, key, df):
+        path = self._path(key)
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        table = pa.Table.from_pandas(df.sort_values('timestamp'), schema=SCHEMA, preserve_index=False)
+        # Uncompressed so reads can map the file instead of decoding it
+        feather.write_feather(table, tmp_path, compression='uncompressed')
+        os.replace(tmp_path, path)
+
+    def _upsert(self, rows, replace=False):
+        """Write rows into their day files; ``replace`` drops what the files held before."""
+        by_day = {}
+        for row in rows:
+            if row.get('timestamp') is not None:
+                by_day.setdefault(rollups.day_key(row['timestamp']), []).append(row)
+        covered_from = self._state['covered_from']
+        for key, day_rows in by_day.items():
+            if covered_from is not None and key < rollups.day_key(covered_from):
+                continue
+            df = frames.build_frame(day_rows, SCHEMA.names)
+            existing = None if replace else self._read_day(key)
+            if existing is not None:
+                df = pd.concat([existing.to_pandas(), df], ignore_index=True)
+                df = df.drop_duplicates('id', keep='last')
+            self._write_day(key, df)
+
+    def _backfill(self, start_date):
+        """Download every violation from ``start_date`` up to what is already covered."""
+        start_time = datetime.combine(start_date, datetime.min.time())
+        covered_from = self._state['covered_from']
+        end_time = None
+        if covered_from is not None:
+            end_time = datetime.combine(covered_from, datetime.min.time()) - timedelta(microseconds=1)
+        rows = violations_data.page_violations_between(self.db, start_time, end_time, HISTORY_FIELDS)
+        self._state['covered_from'] = start_date
+        latest = latest_resolved = None
+        # Rows come oldest first, so each day is written as soon as the next
+        # one starts and only one day is held at a time
+        for _, day_rows in itertools.groupby(rows, key=lambda row: rollups.day_key(row['timestamp'])):
+            day_rows = list(day_rows)
+            self._upsert(day_rows, replace=True)
+            latest = _latest(day_rows, 'timestamp', latest)
+            latest_resolved = _latest(day_rows, 'resolved_at', latest_resolved)
+        if covered_from is None:
+            # Nothing newer than this backfill has been synced yet
+            self._state['watermark'] = latest or _aware(start_time)
+            self._state['resolved_watermark'] = latest_resolved or datetime.now(timezone.utc)
+        self._write_state()
+
+    def _sync(self):
+        watermark = self._state['watermark']
+        resolved_watermark = self._state['resolved_watermark']
+        new = list(violations_data.stream_violations_after(
+            self.db, 'timestamp', watermark - LATE_GRACE, HISTORY_FIELDS
+        ))
+        resolved = list(violations_data.stream_violations_after(
+            self.db, 'resolved_at', resolved_watermark - LATE_GRACE, HISTORY_FIELDS
+        ))
+        self._upsert(new + resolved)
+        self._state['watermark'] = _latest(new, 'timestamp', watermark)
+        self._state['resolved_watermark'] = _latest(resolved, 'resolved_at', resolved_watermark)
+        self._write_state()
+
+    def refresh(self, start_date, force=False):
+        """Make sure days from ``start_date`` are on disk and recently synced."""
+        with self._lock:
+            covered_from = self._state['covered_from']
+            if covered_from is None or start_date < covered_from:
+                self._backfill(start_date)
+                self._last_sync = time.monotonic()
+            elif force or time.monotonic() - self._last_sync > SYNC_INTERVAL:
+                self._sync()
+                self._last_sync = time.monotonic()
+
+    def plate_counts(self, start_date, end_date):
+        """``Counter`` of plate numbers from ``start_date`` to ``end_date``, read one day file at a time."""
+        self.refresh(start_date)
+        counts = collections.Counter()
+        for day in rollups.date_range(start_date, end_date):
+            table = self._read_day(rollups.day_key(day), ['plate_number'])
+            if table is None:
+                continue
+            for item in pc.value_counts(table.column('plate_number')).to_pylist():
+                if item['values'] is not None:
+                    counts[item['values']] += item['counts']
+        return counts
+
+
+@st.cache_resource
+def get_history_cache(_db):
+    return HistoryCache(_db)
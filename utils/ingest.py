@@ -0,0 +1,314 @@
+"""Buffered, batched writing of violations for the edge detectors.
+
+A detector hands every observation of a parked vehicle to an ``Ingestor``
+under the tracker's id for it::
+
+    with ingest.Ingestor(db, 'cam-01', location='Tagapo Market') as ingestor:
+        ingestor.record(track_id, vehicle_type='car', duration=5.0, image_url=url)
+        ingestor.record(track_id, duration=6.0, plate_number='ABC 1234')
+        ingestor.resolve(track_id)
+
+The first ``record`` of a track creates its violation (``timestamp``,
+``status``, ``camera_id`` and ``location`` are filled in); later calls update
+it. Nothing is written right away: observations of the same track are merged
+until the next flush, which happens every ``flush_interval`` seconds or once
+``max_batch`` violations are waiting, and writes everything in as few batches
+as possible. A batch also counts its new violations in the daily rollups and
+plate counts with one write per day and per plate, so the pages' figures stay
+current. A violation's duration keeps growing while the vehicle is parked, so,
+as everywhere in the rollups, it is added once, with the track's last value,
+when the track is resolved.
+
+At most ``max_pending`` violations wait at a time; past that, ``record``
+blocks until a flush makes room, and raises ``queue.Full`` if ``timeout``
+runs out first. A batch that can't be written (no network, Firestore down)
+is kept on disk under ``spool_dir`` and written before anything newer once
+writes succeed again, including after a restart. Violation documents have
+ids derived from camera, start time and track, so writing a batch twice
+leaves them unchanged, but counters would be counted twice; that only
+happens if a commit fails after Firestore applied it.
+
+The ingestor also keeps the camera's heartbeat (see ``utils/health.py``).
+
+Benchmark it against the in-memory fake with ``python -m benchmarks.ingest``.
+"""
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+from utils import health
+from utils import metrics
+from utils import plates
+from utils import rollups
+from utils.violations import BATCH_LIMIT, COLLECTION
+
+FLUSH_INTERVAL = 2.0
+MAX_PENDING = 5000
+SPOOL_DIR = os.path.join(os.path.expanduser('~'), '.violation-spool')
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {'$datetime': value.isoformat()}
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def _decode(value):
+    if set(value) == {'$datetime'}:
+        return datetime.fromisoformat(value['$datetime'])
+    return value
+
+
+def _counter_writes(entry):
+    """The counter documents ``write_batch`` updates for ``entry``, as ``(kind, key)`` pairs."""
+    day = rollups.day_key(entry['timestamp'])
+    plate = entry['data'].get('plate_number')
+    writes = set()
+    if entry['create']:
+        writes.add(('day', day))
+        if plate:
+            writes.add(('plate', plates.plate_id(plate)))
+    if entry['count_plate']:
+        writes.add(('late plate', plates.plate_id(plate)))
+    if entry['resolve']:
+        writes.add(('resolve', day))
+    return writes
+
+
+def chunks(entries, limit=BATCH_LIMIT):
+    """Split pending entries into groups whose writes fit in one batch each."""
+    chunk, counters = [], set()
+    for entry in entries:
+        writes = _counter_writes(entry)
+        # Entries share counter documents, so only new ones add writes
+        if chunk and len(chunk) + 1 + len(counters | writes) > limit:
+            yield chunk
+            chunk, counters = [], set()
+        chunk.append(entry)
+        counters |= writes
+    if chunk:
+        yield chunk
+
+
+def write_batch(db, entries):
+    """Write pending entries (one batch's worth, see ``chunks``) in a single commit."""
+    batch = db.batch()
+    collection = db.collection(COLLECTION)
+    for entry in entries:
+        batch.set(collection.document(entry['id']), entry['data'], merge=True)
+    created = [entry['data'] for entry in entries if entry['create']]
+    # Plates read only after the violation was first written
+    late_plates = [
+        {'plate_number': entry['data']['plate_number'], 'timestamp': entry['timestamp']}
+        for entry in entries if entry['count_plate']
+    ]
+    writes = len(entries) + rollups.record_violations(db, created, batch)
+    if late_plates:
+        # Only plate counts: the violation is already in its day's rollup
+        for key, updates in plates.record_many_updates(late_plates).items():
+            batch.set(db.collection(plates.PLATE_COLLECTION).document(key), updates, merge=True)
+            writes += 1
+    by_day = {}
+    for entry in entries:
+        if entry['resolve']:
+            by_day.setdefault(rollups.day_key(entry['timestamp']), []).append(
+                {'timestamp': entry['timestamp'], 'duration': entry.get('duration')}
+            )
+    for key, resolved in by_day.items():
+        batch.set(db.collection(rollups.ROLLUP_COLLECTION).document(key), rollups.resolve_updates(resolved), merge=True)
+        writes += 1
+    with metrics.track('ingest batch'):
+        batch.commit()
+    return writes
+
+
+class Ingestor:
+    def __init__(self, db, camera_id, location=None, flush_interval=FLUSH_INTERVAL, max_batch=BATCH_LIMIT,
+                 max_pending=MAX_PENDING, spool_dir=None):
+        self.db = db
+        self.camera_id = camera_id
+        self.location = location
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self.spool_dir = spool_dir or os.path.join(SPOOL_DIR, camera_id)
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self.stats = {'events': 0, 'coalesced': 0, 'batches': 0, 'writes': 0, 'spooled': 0, 'replayed': 0}
+
+        self._lock = threading.Lock()
+        self._space = threading.Condition(self._lock)
+        self._due = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._tracks = {}       # tracker id -> {'id', 'timestamp', 'plate', 'duration'}
+        self._pending = {}      # document id -> entry, in arrival order
+        self._oldest = None
+        self._spool_seq = 0
+        self._spooled = any(name.endswith('.json') for name in os.listdir(self.spool_dir))
+        self._last_beat = 0.0
+        self._stopping = False
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def start(self):
+        """Flush on a background thread from now on."""
+        self._thread = threading.Thread(target=self._run, name=f'ingest-{self.camera_id}', daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Stop the background thread and flush whatever is still waiting."""
+        with self._lock:
+            self._stopping = True
+            self._due.notify()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+    def _doc_id(self, track_id, timestamp):
+        # Naive timestamps are UTC, as everywhere else
+        if timestamp.tzinfo:
+            timestamp = timestamp.astimezone(timezone.utc)
+        return f"{self.camera_id}-{timestamp:%Y%m%d%H%M%S}-{track_id}"
+
+    def _entry(self, track, timeout):
+        # Called with the lock held
+        entry = self._pending.get(track['id'])
+        if entry is not None:
+            self.stats['coalesced'] += 1
+            return entry
+        if not self._space.wait_for(lambda: len(self._pending) < self.max_pending, timeout):
+            raise queue.Full(f'{self.max_pending} violations waiting to be written')
+        entry = self._pending.setdefault(track['id'], {
+            'id': track['id'], 'timestamp': track['timestamp'], 'data': {},
+            'create': False, 'count_plate': False, 'resolve': False,
+        })
+        if self._oldest is None:
+            self._oldest = time.monotonic()
+        if len(self._pending) >= self.max_batch:
+            self._due.notify()
+        return entry
+
+    def record(self, track_id, timeout=None, **fields):
+        """Create or update the violation for ``track_id`` with ``fields``."""
+        with self._lock:
+            self.stats['events'] += 1
+            track = self._tracks.get(track_id)
+            if track is None:
+                timestamp = fields.setdefault('timestamp', datetime.now(timezone.utc))
+                track = {'id': self._doc_id(track_id, timestamp), 'timestamp': timestamp, 'plate': False,
+                         'duration': None}
+                entry = self._entry(track, timeout)
+                self._tracks[track_id] = track
+                entry['create'] = True
+                entry['data'].update(status='active', camera_id=self.camera_id)
+                if self.location is not None:
+                    entry['data']['location'] = self.location
+            else:
+                entry = self._entry(track, timeout)
+            entry['data'].update(fields)
+            if 'duration' in fields:
+                track['duration'] = fields['duration']
+            if entry['data'].get('plate_number') and not track['plate']:
+                track['plate'] = True
+                # A violation being created counts its plate along with it
+                entry['count_plate'] = not entry['create']
+
+    def resolve(self, track_id, timeout=None):
+        """Mark the violation for ``track_id`` resolved; False if the track has none."""
+        with self._lock:
+            self.stats['events'] += 1
+            track = self._tracks.get(track_id)
+            if track is None:
+                return False
+            entry = self._entry(track, timeout)
+            del self._tracks[track_id]
+            entry['data'].update(status='resolved', resolved_at=datetime.now(timezone.utc))
+            entry['resolve'] = not entry['create']
+            entry['duration'] = track['duration']
+            return True
+
+    def _spool(self, entries):
+        self._spool_seq += 1
+        path = os.path.join(self.spool_dir, f'{time.time_ns():020d}-{self._spool_seq:06d}.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(entries, f, default=_encode)
+        # A crash mid-write leaves a .tmp file behind rather than half a batch
+        os.replace(path + '.tmp', path)
+        self._spooled = True
+        self.stats['spooled'] += len(entries)
+
+    def _replay(self):
+        """Write spooled batches oldest first; False if one of them still fails."""
+        for name in sorted(os.listdir(self.spool_dir)):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.spool_dir, name)
+            with open(path) as f:
+                entries = json.load(f, object_hook=_decode)
+            try:
+                self.stats['writes'] += write_batch(self.db, entries)
+            except Exception:
+                return False
+            os.remove(path)
+            self.stats['batches'] += 1
+            self.stats['replayed'] += len(entries)
+        self._spooled = False
+        return True
+
+    def flush(self):
+        """Write everything waiting now; returns the number of violations taken."""
+        with self._flush_lock:
+            with self._lock:
+                entries = list(self._pending.values())
+                self._pending = {}
+                self._oldest = None
+                self._space.notify_all()
+            # Spooled batches go first, so a violation's updates stay in order
+            online = self._replay() if self._spooled else True
+            for chunk in chunks(entries):
+                if online:
+                    try:
+                        self.stats['writes'] += write_batch(self.db, chunk)
+                        self.stats['batches'] += 1
+                        continue
+                    except Exception:
+                        online = False
+                self._spool(chunk)
+            return len(entries)
+
+    def _beat(self):
+        if time.monotonic() - self._last_beat < health.HEARTBEAT_INTERVAL:
+            return
+        try:
+            health.beat(self.db, self.camera_id, self.location)
+            self._last_beat = time.monotonic()
+        except Exception:
+            # Offline; the next flush tries again
+            pass
+
+    def _flush_due(self):
+        if len(self._pending) >= self.max_batch:
+            return True
+        return self._oldest is not None and time.monotonic() - self._oldest >= self.flush_interval
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._stopping and not self._flush_due():
+                    waited = 0 if self._oldest is None else time.monotonic() - self._oldest
+                    self._due.wait(self.flush_interval - waited)
+                if self._stopping:
+                    return
+                due = self._flush_due()
+            # Waking up idle still retries the spool and keeps the heartbeat going
+            if due or self._spooled:
+                self.flush()
+            self._beat()
@@ -0,0 +1,102 @@
+"""Process-wide, real-time store of active violations.
+
+One Firestore ``on_snapshot`` listener per server process keeps an in-memory
+copy of every active violation up to date. The listener only delivers the
+documents that were added, modified or removed, and every session reads the
+same copy through ``get_active_store``. Each applied change bumps
+``version``, so a session can tell whether there is anything new to draw
+without touching Firestore.
+"""
+import threading
+from collections import Counter
+
+import streamlit as st
+
+from utils import metrics
+from utils.violations import COLLECTION
+
+# How long a page waits for the listener's first snapshot before falling
+# back to a direct query
+READY_TIMEOUT = 5
+
+
+class ActiveViolationStore:
+    def __init__(self, db):
+        self._lock = threading.Lock()
+        self._violations = {}
+        self._sorted = []
+        self._sorted_version = 0
+        self.version = 0
+        self.ready = threading.Event()
+        query = db.collection(COLLECTION).where('status', '==', 'active')
+        self._watch = query.on_snapshot(self._on_snapshot)
+
+    def _on_snapshot(self, docs, changes, read_time):
+        # Runs on the listener's background thread
+        nbytes = 0
+        with self._lock:
+            for change in changes:
+                doc = change.document
+                data = doc.to_dict()
+                nbytes += metrics.value_size(data) + metrics.DOCUMENT_OVERHEAD
+                # Like the ordered query, skip documents without a timestamp
+                if change.type.name == 'REMOVED' or not data or 'timestamp' not in data:
+                    self._violations.pop(doc.id, None)
+                else:
+                    data['id'] = doc.id
+                    self._violations[doc.id] = data
+            self.version += 1
+        # Each change is billed as a read; pushes have no latency to report
+        metrics.record_query('active listener', None, len(changes), nbytes)
+        self.ready.set()
+
+    @property
+    def alive(self):
+        return self._watch.is_active
+
+    def wait_ready(self, timeout=READY_TIMEOUT):
+        return self.ready.wait(timeout)
+
+    def discard(self, violation_id):
+        """Drop a violation right away, ahead of the listener's REMOVED change."""
+        with self._lock:
+            if self._violations.pop(violation_id, None) is not None:
+                self.version += 1
+
+    def violations(self, cameras=None):
+        """All active violations, newest first; only those from ``cameras`` if given."""
+        with self._lock:
+            if self._sorted_version != self.version:
+                self._sorted = sorted(
+                    self._violations.values(),
+                    key=lambda v: (v['timestamp'], v['id']),
+                    reverse=True,
+                )
+                self._sorted_version = self.version
+            if cameras is None:
+                return self._sorted
+            return [v for v in self._sorted if v.get('camera_id') in cameras]
+
+    def count(self, cameras=None):
+        with self._lock:
+            if cameras is None:
+                return len(self._violations)
+            return sum(1 for v in self._violations.values() if v.get('camera_id') in cameras)
+
+    def counts_by_camera(self):
+        """``{camera_id: number of active violations}``."""
+        with self._lock:
+            return Counter(v.get('camera_id') for v in self._violations.values())
+
+    def window(self, start, count, cameras=None):
+        """Same contract as ``violations.get_active_violations_window``."""
+        return self.violations(cameras)[start:start + count]
+
+    def close(self):
+        self._watch.unsubscribe()
+
+
+@st.cache_resource(validate=lambda store: store.alive)
+def get_active_store(_db):
+    """The shared store; rebuilt if its listener has stopped."""
+    return ActiveViolationStore(_db)
@@ -0,0 +1,227 @@
+"""Timings and read counts for Firestore calls and page reruns.
+
+The data-access code wraps each Firestore call in ``track(label)``, which
+records how long the call took, how many documents it read and roughly how
+many bytes came back. Each record is filed under the page whose rerun made
+the call. Pages call ``begin_rerun`` at the top and ``end_rerun`` at the
+bottom so the whole script run is timed too. Fragment reruns (auto-refresh,
+paging) skip the top of the page, so their calls are filed under the page
+the session last began.
+
+The last ``SAMPLES`` records per page and query stay in process memory for
+the sidebar's p50/p95 figures, and ``export()`` returns them as JSON. Set
+``METRICS_LOG`` to a file path to also append one JSON line per record there.
+
+Pages also call ``painted`` once their header is on screen. The first rerun
+in the process is kept apart as the cold start, timed from when this module
+was first imported, so it includes loading the app's modules.
+"""
+import contextlib
+import contextvars
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import date, datetime, timezone
+
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+SAMPLES = 500
+
+_loaded_at = time.perf_counter()
+
+# Firestore counts a document name as its path plus 16 bytes
+DOCUMENT_OVERHEAD = 16
+
+logger = logging.getLogger(__name__)
+if os.environ.get('METRICS_LOG'):
+    _handler = logging.FileHandler(os.environ['METRICS_LOG'])
+    _handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+# Listener callbacks and other threads without a page or session record as 'background'
+_page = contextvars.ContextVar('metrics_page', default='background')
+# Session state key holding the page for the session's fragment reruns
+SESSION_PAGE_KEY = 'metrics_page'
+_rerun_started = contextvars.ContextVar('metrics_rerun_started', default=None)
+_paint = contextvars.ContextVar('metrics_paint', default=None)
+
+_lock = threading.Lock()
+_queries = defaultdict(lambda: deque(maxlen=SAMPLES))
+_totals = defaultdict(lambda: [0, 0, 0])
+_reruns = defaultdict(lambda: deque(maxlen=SAMPLES))
+_paints = defaultdict(lambda: deque(maxlen=SAMPLES))
+_cold_start = {}
+
+
+def value_size(value):
+    """Approximate stored size of a Firestore value, following Firestore's storage size rules."""
+    if value is None or isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float, datetime, date)):
+        return 8
+    if isinstance(value, str):
+        return len(value.encode('utf-8')) + 1
+    if isinstance(value, bytes):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(len(key) + 1 + value_size(item) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(value_size(item) for item in value)
+    return 16
+
+
+class Recorder:
+    def __init__(self):
+        self.docs = 0
+        self.bytes = 0
+
+    def add(self, data):
+        """Count one downloaded document."""
+        self.docs += 1
+        self.bytes += value_size(data) + DOCUMENT_OVERHEAD
+
+    def reads(self, count):
+        """Count billed reads that don't come back as documents, e.g. aggregations."""
+        self.docs += count
+
+
+@contextlib.contextmanager
+def track(label):
+    """Time the enclosed Firestore call and record what the returned ``Recorder`` counted."""
+    recorder = Recorder()
+    started = time.perf_counter()
+    try:
+        yield recorder
+    finally:
+        record_query(label, time.perf_counter() - started, recorder.docs, recorder.bytes)
+
+
+def _log(record):
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps(dict(record, at=datetime.now(timezone.utc).isoformat())))
+
+
+def _current_page():
+    page = _page.get()
+    if page == 'background':
+        ctx = get_script_run_ctx(suppress_warning=True)
+        if ctx is not None and SESSION_PAGE_KEY in ctx.session_state:
+            page = ctx.session_state[SESSION_PAGE_KEY]
+    return page
+
+
+def record_query(label, seconds, docs, nbytes=0):
+    """Record one call; ``seconds`` is None for pushes (listener updates) that have no latency."""
+    page = _current_page()
+    with _lock:
+        _queries[page, label].append((seconds, docs, nbytes))
+        totals = _totals[page, label]
+        totals[0] += 1
+        totals[1] += docs
+        totals[2] += nbytes
+    _log({'type': 'query', 'page': page, 'query': label,
+          'ms': None if seconds is None else round(seconds * 1000, 1), 'docs': docs, 'bytes': nbytes})
+
+
+def begin_rerun(page):
+    _page.set(page)
+    ctx = get_script_run_ctx(suppress_warning=True)
+    if ctx is not None:
+        ctx.session_state[SESSION_PAGE_KEY] = page
+    _rerun_started.set(time.perf_counter())
+    _paint.set(None)
+
+
+def painted():
+    """Mark the page's first content as drawn; only the first call in a rerun counts."""
+    started = _rerun_started.get()
+    if started is None or _paint.get() is not None:
+        return
+    now = time.perf_counter()
+    _paint.set(now)
+    with _lock:
+        _paints[_page.get()].append(now - started)
+
+
+def end_rerun():
+    started = _rerun_started.get()
+    if started is None:
+        return
+    _rerun_started.set(None)
+    ended = time.perf_counter()
+    seconds = ended - started
+    page = _page.get()
+    painted_at = _paint.get()
+    with _lock:
+        _reruns[page].append(seconds)
+        first = not _cold_start
+        if first:
+            _cold_start.update({
+                'page': page,
+                'first_paint_ms': None if painted_at is None else round((painted_at - _loaded_at) * 1000, 1),
+                'total_ms': round((ended - _loaded_at) * 1000, 1),
+            })
+    _log({'type': 'rerun', 'page': page, 'ms': round(seconds * 1000, 1)})
+    if first:
+        _log(dict(_cold_start, type='cold start'))
+
+
+def _percentile(values, fraction):
+    if not values:
+        return None
+    # Nearest-rank percentile
+    values = sorted(values)
+    return round(values[max(0, math.ceil(fraction * len(values)) - 1)] * 1000, 1)
+
+
+def rerun_summary():
+    """Per page: reruns recorded, p50/p95 script time and p50 time to first paint, in ms over the recent window."""
+    with _lock:
+        reruns = {page: list(samples) for page, samples in _reruns.items()}
+        paints = {page: list(samples) for page, samples in _paints.items()}
+    return [
+        {'page': page, 'reruns': len(samples), 'p50_ms': _percentile(samples, 0.5), 'p95_ms': _percentile(samples, 0.95),
+         'paint_p50_ms': _percentile(paints.get(page, []), 0.5)}
+        for page, samples in sorted(reruns.items())
+    ]
+
+
+def cold_start():
+    """The process's first rerun: its page and ms from loading the app to first paint and to the end, or None."""
+    with _lock:
+        return dict(_cold_start) or None
+
+
+def query_summary():
+    """Per page and query: lifetime calls, documents and bytes, plus recent p50/p95 latency; most reads first."""
+    with _lock:
+        rows = []
+        for (page, label), samples in _queries.items():
+            calls, docs, nbytes = _totals[page, label]
+            latencies = [seconds for seconds, _, _ in samples if seconds is not None]
+            rows.append({
+                'page': page,
+                'query': label,
+                'calls': calls,
+                'docs_read': docs,
+                'kb': round(nbytes / 1024, 1),
+                'p50_ms': _percentile(latencies, 0.5),
+                'p95_ms': _percentile(latencies, 0.95),
+            })
+    return sorted(rows, key=lambda row: row['docs_read'], reverse=True)
+
+
+def export():
+    """Everything recorded so far, as a JSON document."""
+    return json.dumps({
+        'generated_at': datetime.now(timezone.utc).isoformat(),
+        'cold_start': cold_start(),
+        'reruns': rerun_summary(),
+        'queries': query_summary(),
+    }, indent=2)
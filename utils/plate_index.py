@@ -0,0 +1,157 @@
+"""In-memory search over every plate number, tolerant of OCR misreads.
+
+Plates are folded to a search key: letters and digits only, upper case, with
+characters the camera's OCR tends to confuse mapped to one of the pair
+(``O``/``Q`` to ``0``, ``I`` to ``1``, ``B`` to ``8``, ``S`` to ``5``, ``Z`` to
+``2``). Misreads of the same plate share a key, and each key is indexed by
+its trigrams. A query is folded the same way and matches keys that equal it,
+start with it or contain it, or, for near-complete plates, differ from it by
+one edit. Candidates come from the trigram postings, so a search touches only
+plates that share trigrams with the query.
+
+The index is filled from the ``plates`` collection (one small document per
+plate, see ``utils/plates.py``) and kept current by reading only plates whose
+``last_seen`` moved since the previous sync.
+"""
+import bisect
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+
+import streamlit as st
+
+from utils import plates
+from utils import violations as violations_data
+
+GRAM = 3
+MAX_EDITS = 1
+# Queries shorter than this only match by prefix or substring
+FUZZY_MIN_LENGTH = 5
+
+# How often a search may trigger a sync, in seconds
+SYNC_INTERVAL = violations_data.TODAY_TTL
+LATE_GRACE = timedelta(minutes=10)
+
+CONFUSABLE = str.maketrans({'O': '0', 'Q': '0', 'I': '1', 'B': '8', 'S': '5', 'Z': '2'})
+
+# Lower ranks are listed first
+EXACT, PREFIX, CONTAINS, SIMILAR = range(4)
+MATCH_LABELS = {EXACT: 'exact', PREFIX: 'prefix', CONTAINS: 'contains', SIMILAR: 'similar'}
+
+
+def search_key(plate):
+    return ''.join(ch for ch in plate.upper() if ch.isalnum()).translate(CONFUSABLE)
+
+
+def _grams(key):
+    return {key[i:i + GRAM] for i in range(len(key) - GRAM + 1)}
+
+
+def _within_one_edit(a, b):
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if len(a) == len(b):
+        return a[i + 1:] == b[i + 1:]
+    return a[i:] == b[i + 1:]
+
+
+class PlateIndex:
+    def __init__(self, db):
+        self.db = db
+        self._lock = threading.Lock()
+        self._last_sync = 0.0
+        self._watermark = None
+        self._plates = {}       # plate number -> {'total', 'last_seen'}
+        self._variants = {}     # search key -> plate numbers
+        self._postings = {}     # trigram -> search keys
+        self._keys = []         # sorted search keys, for short prefix queries
+
+    def _add(self, doc, keep_sorted=True):
+        plate = doc.get('plate_number')
+        if not plate:
+            return
+        self._plates[plate] = {'total': doc.get('total', 0), 'last_seen': doc.get('last_seen')}
+        key = search_key(plate)
+        if key in self._variants:
+            self._variants[key].add(plate)
+            return
+        self._variants[key] = {plate}
+        if keep_sorted:
+            bisect.insort(self._keys, key)
+        else:
+            self._keys.append(key)
+        for gram in _grams(key):
+            self._postings.setdefault(gram, set()).add(key)
+
+    def _sync(self):
+        first = self._watermark is None
+        after = None if first else self._watermark - LATE_GRACE
+        for doc in plates.stream_plates(self.db, after):
+            # The first load sorts once at the end instead of on every insert
+            self._add(doc, keep_sorted=not first)
+            if doc.get('last_seen') is not None and (self._watermark is None or doc['last_seen'] > self._watermark):
+                self._watermark = doc['last_seen']
+        if first:
+            self._keys.sort()
+
+    def refresh(self, force=False):
+        with self._lock:
+            if force or not self._last_sync or time.monotonic() - self._last_sync > SYNC_INTERVAL:
+                self._sync()
+                self._last_sync = time.monotonic()
+
+    def _candidates(self, key):
+        if len(key) < GRAM:
+            start = bisect.bisect_left(self._keys, key)
+            end = bisect.bisect_left(self._keys, key + '\uffff')
+            return self._keys[start:end]
+        grams = _grams(key)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._postings.get(gram, ()))
+        # One edit changes at most GRAM trigrams
+        needed = len(grams) if len(key) < FUZZY_MIN_LENGTH else max(1, len(grams) - GRAM * MAX_EDITS)
+        return [candidate for candidate, count in shared.items() if count >= needed]
+
+    def search(self, query, limit=20):
+        """Plates matching ``query``, best first: ``[{'plate', 'match', 'total', 'last_seen'}]``."""
+        key = search_key(query)
+        if not key:
+            return []
+        self.refresh()
+        with self._lock:
+            ranked = []
+            for candidate in self._candidates(key):
+                if candidate == key:
+                    rank = EXACT
+                elif candidate.startswith(key):
+                    rank = PREFIX
+                elif key in candidate:
+                    rank = CONTAINS
+                elif len(key) >= FUZZY_MIN_LENGTH and _within_one_edit(key, candidate):
+                    rank = SIMILAR
+                else:
+                    continue
+                for plate in self._variants[candidate]:
+                    ranked.append((rank, -self._plates[plate]['total'], plate))
+            ranked.sort()
+            return [
+                dict(self._plates[plate], plate=plate, match=MATCH_LABELS[rank])
+                for rank, _, plate in ranked[:limit]
+            ]
+
+    def variants(self, plate):
+        """Every indexed plate number that folds to the same search key as ``plate``."""
+        with self._lock:
+            return sorted(self._variants.get(search_key(plate), {plate}))
+
+
+@st.cache_resource
+def get_plate_index(_db):
+    return PlateIndex(_db)
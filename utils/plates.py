@@ -0,0 +1,178 @@
+"""Per-plate violation counts in the ``plates`` collection.
+
+Each plate number has one document with its all-time ``total``, a count per
+UTC month (``months.m2025_03``) and per ISO week (``weeks.w2025_11``), and
+the timestamp it was ``last_seen``. ``rollups.record_violation`` updates it
+in the same write as the day's rollup, so counts move as violations arrive.
+
+Firestore indexes every field, map entries included, so the top plates for a
+window are one query ordered by that window's field and limited to ``k``
+documents: ``k`` reads however long the history. Counts can be rebuilt from
+the raw violations::
+
+    python -m utils.plates
+"""
+import argparse
+from datetime import datetime, timezone
+
+import streamlit as st
+
+from utils import bootstrap
+from utils import metrics
+
+PLATE_COLLECTION = 'plates'
+TOP_TTL = 60
+BATCH_LIMIT = 500
+
+WINDOWS = {'week': 'This week', 'month': 'This month', 'all': 'All time'}
+
+
+def _utc(timestamp):
+    return timestamp.astimezone(timezone.utc) if timestamp.tzinfo else timestamp
+
+
+def plate_id(plate):
+    # Document ids can't contain '/'
+    return plate.replace('/', '_')
+
+
+def month_key(timestamp):
+    return _utc(timestamp).strftime('m%Y_%m')
+
+
+def week_key(timestamp):
+    year, week, _ = _utc(timestamp).isocalendar()
+    return 'w%d_%02d' % (year, week)
+
+
+def window_field(window, now=None):
+    """Field holding the count for ``window`` ('week', 'month' or 'all'), as of ``now``."""
+    now = now or datetime.now(timezone.utc)
+    if window == 'week':
+        return 'weeks.' + week_key(now)
+    if window == 'month':
+        return 'months.' + month_key(now)
+    if window == 'all':
+        return 'total'
+    raise ValueError(f'unknown window {window!r}')
+
+
+def plate_ref(db, plate):
+    return db.collection(PLATE_COLLECTION).document(plate_id(plate))
+
+
+def record_updates(violation):
+    """Merge-set payload that counts a new violation against its plate."""
+    from firebase_admin import firestore
+
+    timestamp = violation['timestamp']
+    return {
+        'plate_number': violation['plate_number'],
+        'total': firestore.Increment(1),
+        'months': {month_key(timestamp): firestore.Increment(1)},
+        'weeks': {week_key(timestamp): firestore.Increment(1)},
+        'last_seen': timestamp,
+    }
+
+
+def record_many_updates(violations):
+    """Merge-set payloads (``{document_id: payload}``) that count many new violations against their plates."""
+    from firebase_admin import firestore
+
+    return {
+        key: {
+            'plate_number': doc['plate_number'],
+            'total': firestore.Increment(doc['total']),
+            'months': {month: firestore.Increment(count) for month, count in doc['months'].items()},
+            'weeks': {week: firestore.Increment(count) for week, count in doc['weeks'].items()},
+            'last_seen': doc['last_seen'],
+        }
+        for key, doc in build_counts(violations).items()
+    }
+
+
+@st.cache_data(ttl=TOP_TTL, show_spinner=False)
+def get_top_plates(_db, field, k=10):
+    """``[(plate, count)]`` for the ``k`` plates with the highest ``field`` (see ``window_field``)."""
+    from firebase_admin import firestore
+
+    query = (
+        _db.collection(PLATE_COLLECTION)
+        .order_by(field, direction=firestore.Query.DESCENDING)
+        .limit(k)
+        .select(['plate_number', field])
+    )
+    top = []
+    with metrics.track('top plates') as recorder:
+        for doc in query.stream():
+            recorder.add(doc.to_dict())
+            top.append((doc.get('plate_number'), doc.get(field)))
+        if not top:
+            recorder.reads(1)
+    return top
+
+
+def stream_plates(db, seen_after=None):
+    """Uncached generator over plate documents, or only those ``last_seen`` after ``seen_after``."""
+    query = db.collection(PLATE_COLLECTION)
+    if seen_after is not None:
+        query = query.where('last_seen', '>', seen_after)
+    query = query.select(['plate_number', 'total', 'last_seen'])
+    with metrics.track('plates' if seen_after is None else 'plates seen after') as recorder:
+        for doc in query.stream():
+            data = doc.to_dict()
+            recorder.add(data)
+            yield data
+        if not recorder.docs:
+            recorder.reads(1)
+
+
+def build_counts(violations):
+    """Plate documents (``{document_id: doc}``) counted from raw violations."""
+    docs = {}
+    for violation in violations:
+        plate, timestamp = violation.get('plate_number'), violation.get('timestamp')
+        if not plate or timestamp is None:
+            continue
+        doc = docs.setdefault(plate_id(plate), {'plate_number': plate, 'total': 0, 'months': {}, 'weeks': {}, 'last_seen': timestamp})
+        doc['total'] += 1
+        month, week = month_key(timestamp), week_key(timestamp)
+        doc['months'][month] = doc['months'].get(month, 0) + 1
+        doc['weeks'][week] = doc['weeks'].get(week, 0) + 1
+        doc['last_seen'] = max(doc['last_seen'], timestamp)
+    return docs
+
+
+def write_counts(db, docs):
+    """Overwrite plate documents (``{document_id: doc}``) in batches of 500."""
+    batch = db.batch()
+    pending = 0
+    for key, doc in docs.items():
+        batch.set(db.collection(PLATE_COLLECTION).document(key), doc)
+        pending += 1
+        if pending == BATCH_LIMIT:
+            with metrics.track('plate writes'):
+                batch.commit()
+            batch = db.batch()
+            pending = 0
+    if pending:
+        with metrics.track('plate writes'):
+            batch.commit()
+
+
+def main():
+    # Imported here: violations depends on rollups, which depends on this module
+    from utils import violations as violations_data
+
+    argparse.ArgumentParser(description='Rebuild per-plate violation counts from every violation.').parse_args()
+    db = bootstrap.get_db()
+    violations = violations_data.stream_violations_between(
+        db, datetime(1970, 1, 1, tzinfo=timezone.utc), fields=('plate_number', 'timestamp')
+    )
+    docs = build_counts(violations)
+    write_counts(db, docs)
+    print(f"Rebuilt counts for {len(docs)} plates")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,21 @@
+"""Auto-refresh setting shared by the pages with live sections.
+
+Live sections are fragments that rerun on a timer (``st.fragment(run_every=...)``),
+so refreshing them never reruns the rest of the page.
+"""
+import streamlit as st
+
+INTERVALS = {'Off': None, '10 seconds': 10, '30 seconds': 30, '1 minute': 60}
+DEFAULT_INTERVAL = '30 seconds'
+
+
+def auto_refresh_interval():
+    """Show the sidebar auto-refresh picker; returns seconds between refreshes, or None."""
+    # Kept outside the widget's own state so the choice survives page switches
+    if 'auto_refresh' not in st.session_state:
+        st.session_state.auto_refresh = DEFAULT_INTERVAL
+    options = list(INTERVALS)
+    with st.sidebar:
+        choice = st.selectbox("🔄 Auto-refresh", options, index=options.index(st.session_state.auto_refresh))
+    st.session_state.auto_refresh = choice
+    return INTERVALS[choice]
@@ -0,0 +1,395 @@
+"""Daily rollup documents for the ``violations`` collection.
+
+Each UTC day has one document in ``violation_rollups`` (id ``YYYY-MM-DD``)
+with that day's aggregates, and its ``hours`` map holds the same aggregates
+for each hour (``"00"`` to ``"23"``). Overview tiles and Analytics charts
+read these instead of raw violations, so a 90-day range costs about 90 small
+reads. The aggregate fields are::
+
+    total, status.{active,resolved}, vehicle_type.{car,...}, cameras.{cam-01,...},
+    duration_sum, duration_count, duration_min, duration_max
+
+``cameras`` counts violations per ``camera_id``; violations written before
+cameras were tagged aren't in it. The ``duration_*`` fields cover resolved
+violations only: an active violation's duration is still growing, so it is
+added when the violation is resolved (``resolve_updates``), and a rebuild
+leaves active violations' durations out too.
+
+Writers keep the documents current with ``record_violation`` for every new
+violation, or ``record_violations`` for a batch of them; both also update the
+plates' counts (see ``utils/plates.py``). Resolving goes through
+``violations.resolve_violation``, which applies ``resolve_updates`` in the
+same transaction. Past days can be rebuilt or backfilled from the raw
+documents::
+
+    python -m utils.rollups --start 2025-01-01 --end 2025-03-31
+
+A document the writers created only holds the violations recorded through
+them, so readers trust a day only once it has been rebuilt from the raw
+documents (``rebuilt_at`` is set, see ``is_complete``). The first view of a
+day counts it from the raw documents and stores it (``store_rebuilt``),
+today included; from then on the writers' increments keep it current. The
+store is skipped if a writer changed the day while it was being counted, and
+the next view tries again. A violation whose document and rollup increment
+aren't written in one batch is counted twice if the day is stored in between,
+so pass ``batch`` to ``record_violation``. A violation
+resolved without ``resolve_violation`` leaves an already rebuilt day stale
+until it is rebuilt again.
+"""
+import argparse
+from datetime import date, datetime, timedelta, timezone
+
+from google.api_core.exceptions import Conflict, FailedPrecondition
+
+from utils import bootstrap
+from utils import metrics
+from utils import plates
+
+ROLLUP_COLLECTION = 'violation_rollups'
+
+
+def _utc(timestamp):
+    # Firestore returns aware UTC timestamps; naive ones are already UTC
+    return timestamp.astimezone(timezone.utc) if timestamp.tzinfo else timestamp
+
+
+def day_key(value):
+    """Document id for the day of a timestamp or date."""
+    if isinstance(value, datetime):
+        value = _utc(value)
+    return value.strftime('%Y-%m-%d')
+
+
+def hour_key(timestamp):
+    return '%02d' % _utc(timestamp).hour
+
+
+def empty_bucket():
+    return {
+        'total': 0,
+        'status': {'active': 0, 'resolved': 0},
+        'vehicle_type': {},
+        'cameras': {},
+        'duration_sum': 0.0,
+        'duration_count': 0,
+        'duration_min': None,
+        'duration_max': None,
+    }
+
+
+def add(bucket, violation):
+    """Fold one violation dict into an aggregate bucket."""
+    bucket['total'] += 1
+    status = violation.get('status', 'active')
+    bucket['status'][status] = bucket['status'].get(status, 0) + 1
+    vtype = violation.get('vehicle_type', 'unknown')
+    bucket['vehicle_type'][vtype] = bucket['vehicle_type'].get(vtype, 0) + 1
+    camera = violation.get('camera_id')
+    if camera:
+        bucket['cameras'][camera] = bucket['cameras'].get(camera, 0) + 1
+    if status != 'active' and violation.get('duration') is not None:
+        add_duration(bucket, violation['duration'])
+    return bucket
+
+
+def add_duration(bucket, duration):
+    bucket['duration_sum'] += duration
+    bucket['duration_count'] += 1
+    if bucket['duration_min'] is None or duration < bucket['duration_min']:
+        bucket['duration_min'] = duration
+    if bucket['duration_max'] is None or duration > bucket['duration_max']:
+        bucket['duration_max'] = duration
+    return bucket
+
+
+def merge(bucket, other):
+    """Fold another bucket into ``bucket``."""
+    bucket['total'] += other.get('total', 0)
+    for field in ('status', 'vehicle_type', 'cameras'):
+        for key, count in other.get(field, {}).items():
+            bucket[field][key] = bucket[field].get(key, 0) + count
+    bucket['duration_sum'] += other.get('duration_sum', 0)
+    bucket['duration_count'] += other.get('duration_count', 0)
+    for field, pick in (('duration_min', min), ('duration_max', max)):
+        if other.get(field) is not None:
+            bucket[field] = other[field] if bucket[field] is None else pick(bucket[field], other[field])
+    return bucket
+
+
+def combine(docs):
+    """One bucket (with a combined ``hours`` map) for several day documents."""
+    combined = dict(empty_bucket(), hours={})
+    for doc in docs:
+        merge(combined, doc)
+        for hour, bucket in doc.get('hours', {}).items():
+            merge(combined['hours'].setdefault(hour, empty_bucket()), bucket)
+    return combined
+
+
+def build_days(violations, days):
+    """Rollup documents for ``days`` (date objects) computed from raw violations."""
+    docs = {day_key(d): dict(empty_bucket(), date=day_key(d), hours={}) for d in days}
+    for violation in violations:
+        timestamp = violation.get('timestamp')
+        if timestamp is None:
+            continue
+        doc = docs.get(day_key(timestamp))
+        if doc is None:
+            continue
+        add(doc, violation)
+        add(doc['hours'].setdefault(hour_key(timestamp), empty_bucket()), violation)
+    return docs
+
+
+def _bucket_increments(violation):
+    from firebase_admin import firestore
+
+    updates = {
+        'total': firestore.Increment(1),
+        'status': {violation.get('status', 'active'): firestore.Increment(1)},
+        'vehicle_type': {violation.get('vehicle_type', 'unknown'): firestore.Increment(1)},
+    }
+    if violation.get('camera_id'):
+        updates['cameras'] = {violation['camera_id']: firestore.Increment(1)}
+    duration = violation.get('duration')
+    # Counted on resolve while the violation is still active
+    if duration is not None and violation.get('status', 'active') != 'active':
+        updates.update({
+            'duration_sum': firestore.Increment(duration),
+            'duration_count': firestore.Increment(1),
+            'duration_min': firestore.Minimum(duration),
+            'duration_max': firestore.Maximum(duration),
+        })
+    return updates
+
+
+def record_updates(violation):
+    """Merge-set payload that adds a new violation to its day and hour."""
+    updates = _bucket_increments(violation)
+    updates['date'] = day_key(violation['timestamp'])
+    updates['hours'] = {hour_key(violation['timestamp']): _bucket_increments(violation)}
+    return updates
+
+
+def _increments(bucket):
+    from firebase_admin import firestore
+
+    # Zero counts are left out rather than sent as no-op transforms
+    updates = {'total': firestore.Increment(bucket['total'])}
+    for field in ('status', 'vehicle_type', 'cameras'):
+        counts = {key: firestore.Increment(count) for key, count in bucket[field].items() if count}
+        if counts:
+            updates[field] = counts
+    updates.update(_duration_increments(bucket))
+    return updates
+
+
+def _duration_increments(bucket):
+    from firebase_admin import firestore
+
+    if not bucket['duration_count']:
+        return {}
+    return {
+        'duration_sum': firestore.Increment(bucket['duration_sum']),
+        'duration_count': firestore.Increment(bucket['duration_count']),
+        'duration_min': firestore.Minimum(bucket['duration_min']),
+        'duration_max': firestore.Maximum(bucket['duration_max']),
+    }
+
+
+def record_many_updates(violations):
+    """Merge-set payloads (``{day_key: payload}``) that add many new violations to their days and hours."""
+    violations = [violation for violation in violations if violation.get('timestamp') is not None]
+    days = sorted({_utc(violation['timestamp']).date() for violation in violations})
+    return {
+        key: dict(_increments(doc), date=key, hours={hour: _increments(bucket) for hour, bucket in doc['hours'].items()})
+        for key, doc in build_days(violations, days).items()
+    }
+
+
+def _moved(count):
+    from firebase_admin import firestore
+
+    return {'status': {'active': firestore.Increment(-count), 'resolved': firestore.Increment(count)}}
+
+
+def resolve_updates(violations):
+    """Merge-set payload that moves active violations (all from one day) to resolved and adds their durations."""
+    per_hour = {}
+    day, hours = empty_bucket(), {}
+    for violation in violations:
+        hour = hour_key(violation['timestamp'])
+        per_hour[hour] = per_hour.get(hour, 0) + 1
+        if violation.get('duration') is not None:
+            add_duration(day, violation['duration'])
+            add_duration(hours.setdefault(hour, empty_bucket()), violation['duration'])
+    updates = dict(_moved(len(violations)), **_duration_increments(day))
+    updates['hours'] = {
+        hour: dict(_moved(count), **_duration_increments(hours.get(hour, empty_bucket())))
+        for hour, count in per_hour.items()
+    }
+    return updates
+
+
+def rollup_ref(db, when):
+    return db.collection(ROLLUP_COLLECTION).document(day_key(when))
+
+
+def record_violation(db, violation, batch=None):
+    """Count a newly written violation in its day's rollup and its plate's counts.
+
+    Pass ``batch`` to join an existing write batch; this adds up to two writes to it.
+    """
+    own_batch = batch is None
+    if own_batch:
+        batch = db.batch()
+    batch.set(rollup_ref(db, violation['timestamp']), record_updates(violation), merge=True)
+    if violation.get('plate_number'):
+        batch.set(plates.plate_ref(db, violation['plate_number']), plates.record_updates(violation), merge=True)
+    if own_batch:
+        with metrics.track('record rollup'):
+            batch.commit()
+
+
+def record_violations(db, violations, batch):
+    """Count many newly written violations with one write per day and one per plate.
+
+    Adds the writes to ``batch`` and returns how many it added.
+    """
+    violations = list(violations)
+    days = record_many_updates(violations)
+    counts = plates.record_many_updates(violations)
+    for key, updates in days.items():
+        batch.set(db.collection(ROLLUP_COLLECTION).document(key), updates, merge=True)
+    for key, updates in counts.items():
+        batch.set(db.collection(plates.PLATE_COLLECTION).document(key), updates, merge=True)
+    return len(days) + len(counts)
+
+
+def is_complete(doc):
+    """Whether a stored rollup document counts every violation of its day."""
+    return doc is not None and 'rebuilt_at' in doc
+
+
+def summary(doc):
+    """Overview numbers (total/active/resolved/avg duration of resolved violations) from a rollup bucket."""
+    total = doc.get('total', 0)
+    active = doc.get('status', {}).get('active', 0)
+    counted = doc.get('duration_count', 0)
+    return {
+        'total': total,
+        'active': active,
+        'resolved': total - active,
+        'avg_duration': doc.get('duration_sum', 0) / counted if counted > 0 else 0,
+    }
+
+
+def date_range(start_date, end_date):
+    days = []
+    day = start_date
+    while day <= end_date:
+        days.append(day)
+        day += timedelta(days=1)
+    return days
+
+
+def write_days(db, docs):
+    """Overwrite rollup documents (``{day_key: doc}``) in batches of 500."""
+    from firebase_admin import firestore
+
+    batch = db.batch()
+    pending = 0
+    for key, doc in docs.items():
+        batch.set(db.collection(ROLLUP_COLLECTION).document(key), dict(doc, rebuilt_at=firestore.SERVER_TIMESTAMP))
+        pending += 1
+        if pending == 500:
+            with metrics.track('rollup writes'):
+                batch.commit()
+            batch = db.batch()
+            pending = 0
+    if pending:
+        with metrics.track('rollup writes'):
+            batch.commit()
+
+
+def store_rebuilt(db, docs, snapshots):
+    """Store days counted from the raw documents unless a writer changed them meanwhile.
+
+    ``snapshots`` holds the rollup documents as read before counting
+    (``{day_key: snapshot}``, no entry for days without one). Each write is
+    conditioned on its snapshot, so an increment that landed during the count
+    isn't overwritten; that day is left for the next view to count again.
+    Returns the keys stored.
+    """
+    stored = []
+    keys = list(docs)
+    for start in range(0, len(keys), 500):
+        piece = keys[start:start + 500]
+        if _commit_rebuilt(db, docs, snapshots, piece):
+            stored += piece
+        elif len(piece) > 1:
+            # A writer changed one of these days: store the others one at a time
+            stored += [key for key in piece if _commit_rebuilt(db, docs, snapshots, [key])]
+    return stored
+
+
+def _commit_rebuilt(db, docs, snapshots, keys):
+    from firebase_admin import firestore
+
+    batch = db.batch()
+    for key in keys:
+        ref = db.collection(ROLLUP_COLLECTION).document(key)
+        doc = dict(docs[key], rebuilt_at=firestore.SERVER_TIMESTAMP)
+        snapshot = snapshots.get(key)
+        if snapshot is None:
+            batch.create(ref, doc)
+        else:
+            batch.update(ref, doc, option=db.write_option(last_update_time=snapshot.update_time))
+    try:
+        with metrics.track('rollup writes'):
+            batch.commit()
+    except (Conflict, FailedPrecondition):
+        return False
+    return True
+
+
+def rebuild(db, violations, start_date, end_date):
+    """Recompute every day in the range from raw violations, including empty days."""
+    docs = build_days(violations, date_range(start_date, end_date))
+    write_days(db, docs)
+    return len(docs)
+
+
+def today():
+    return datetime.now(timezone.utc).date()
+
+
+def main():
+    # Imported here: violations depends on this module
+    from utils import violations as violations_data
+
+    yesterday = today() - timedelta(days=1)
+    parser = argparse.ArgumentParser(description='Rebuild or backfill daily violation rollups.')
+    parser.add_argument('--start', type=date.fromisoformat, default=yesterday)
+    parser.add_argument('--end', type=date.fromisoformat, default=yesterday,
+                        help='last day to rebuild (default: yesterday)')
+    args = parser.parse_args()
+
+    db = bootstrap.get_db()
+
+    current = args.start
+    while current <= args.end:
+        # A month at a time keeps memory bounded on long backfills
+        chunk_end = min(args.end, current + timedelta(days=30))
+        start_time = datetime.combine(current, datetime.min.time())
+        end_time = datetime.combine(chunk_end, datetime.max.time())
+        violations = violations_data.stream_violations_between(
+            db, start_time, end_time, violations_data.ROLLUP_FIELDS
+        )
+        written = rebuild(db, violations, current, chunk_end)
+        print(f"Rebuilt {written} days: {current} to {chunk_end}")
+        current = chunk_end + timedelta(days=1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+"""The look shared by every page, served as static files.
+
+``static/theme.css`` is served by Streamlit's static file serving
+(``server.enableStaticServing`` in ``.streamlit/config.toml``), so a rerun
+sends a link tag instead of the whole stylesheet. Each URL carries a hash of
+the file's contents: browsers may keep it as long as they like and still get
+the new file after a deploy that changes it. The Inter font is served from
+``static/fonts`` too, rather than fetched from Google on every phone.
+"""
+import hashlib
+import os
+
+import streamlit as st
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static')
+STYLESHEET = 'theme.css'
+FONT_STYLESHEET = 'fonts/inter.css'
+# Without the font file the theme falls back to system fonts
+FONT = 'fonts/inter-latin.woff2'
+
+
+def _link(name):
+    with open(os.path.join(STATIC_DIR, name), 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()[:12]
+    return f'<link rel="stylesheet" href="app/static/{name}?v={digest}">'
+
+
+@st.cache_resource(show_spinner=False)
+def _links():
+    links = _link(STYLESHEET)
+    if os.path.exists(os.path.join(STATIC_DIR, FONT)):
+        links += _link(FONT_STYLESHEET)
+    return links
+
+
+def apply():
+    """Link the theme; call right after ``st.set_page_config``."""
+    st.markdown(_links(), unsafe_allow_html=True)
@@ -0,0 +1,141 @@
+"""Small, cached renditions of violation snapshots.
+
+Cards used to pass ``image_url`` straight to ``st.image``, so every rerun
+pulled the full camera frame. ``ThumbnailCache`` downloads each snapshot once,
+writes small and medium JPEG renditions to a bounded on-disk cache keyed by a
+hash of the URL, and evicts the least recently used files once the cache
+grows past its budget. The full-resolution frame is only fetched when
+someone clicks through to it. A snapshot that can't be fetched isn't tried
+again for ``FAILURE_TTL`` seconds, so a dead host doesn't hold up every
+card on every rerun.
+"""
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+import streamlit as st
+from PIL import Image
+
+# Longest side of each rendition, in pixels
+RENDITIONS = {'small': 160, 'medium': 480}
+JPEG_QUALITY = 80
+
+CACHE_DIR = os.path.join(tempfile.gettempdir(), 'violation-thumbnails')
+MAX_CACHE_BYTES = 200 * 1024 * 1024
+FETCH_TIMEOUT = 3
+# Seconds before a snapshot that failed to download is tried again
+FAILURE_TTL = 60
+MAX_SOURCE_BYTES = 20 * 1024 * 1024
+
+
+class ThumbnailCache:
+    def __init__(self, directory=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._size_lock = threading.Lock()
+        self._size = sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file())
+        # Striped locks so two sessions never fetch the same URL at once
+        self._fetch_locks = [threading.Lock() for _ in range(32)]
+        self._failed = {}       # key -> time.monotonic() of the last failed fetch
+
+    def _key(self, url):
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+    def _path(self, key, rendition):
+        return os.path.join(self.directory, f'{key}-{rendition}.jpg')
+
+    def get(self, url, rendition='small'):
+        """Path to a rendition of ``url``, fetching and resizing it on first use; None if that failed recently."""
+        key = self._key(url)
+        path = self._path(key, rendition)
+        if self._touch(path):
+            return path
+        if self._recently_failed(key):
+            return None
+        with self._fetch_locks[int(key[:8], 16) % len(self._fetch_locks)]:
+            # Another session may have rendered it, or failed to, while we waited
+            if self._touch(path):
+                return path
+            if self._recently_failed(key):
+                return None
+            try:
+                self._render(url, key)
+            except Exception:
+                self._failed[key] = time.monotonic()
+                raise
+        self._failed.pop(key, None)
+        return path
+
+    def _recently_failed(self, key):
+        failed_at = self._failed.get(key)
+        return failed_at is not None and time.monotonic() - failed_at < FAILURE_TTL
+
+    def _touch(self, path):
+        # The access time drives LRU eviction
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _fetch(self, url):
+        # urlopen also opens file:// and ftp:// URLs, which stored data mustn't reach
+        if urllib.parse.urlsplit(url).scheme not in ('http', 'https'):
+            raise ValueError(f"Not an http(s) snapshot URL: {url}")
+        with urllib.request.urlopen(url, timeout=FETCH_TIMEOUT) as response:
+            data = response.read(MAX_SOURCE_BYTES + 1)
+        if len(data) > MAX_SOURCE_BYTES:
+            raise ValueError(f"Snapshot larger than {MAX_SOURCE_BYTES} bytes: {url}")
+        return data
+
+    def _render(self, url, key):
+        with Image.open(io.BytesIO(self._fetch(url))) as source:
+            source = source.convert('RGB')
+            written = 0
+            for rendition, longest_side in RENDITIONS.items():
+                image = source.copy()
+                image.thumbnail((longest_side, longest_side))
+                path = self._path(key, rendition)
+                tmp_path = f'{path}.{threading.get_ident()}.tmp'
+                image.save(tmp_path, 'JPEG', quality=JPEG_QUALITY, optimize=True)
+                written += os.path.getsize(tmp_path)
+                os.replace(tmp_path, path)
+        with self._size_lock:
+            self._size += written
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Drop least recently used files until we are back under 90% of the budget
+        entries = sorted(
+            (entry.stat().st_mtime, entry.stat().st_size, entry.path)
+            for entry in os.scandir(self.directory) if entry.is_file()
+        )
+        self._size = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if self._size <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+                self._size -= size
+            except FileNotFoundError:
+                pass
+
+
+@st.cache_resource
+def get_thumbnail_cache():
+    return ThumbnailCache()
+
+
+def thumbnail(url, rendition='small'):
+    """Image for ``st.image``: a cached rendition, or the original URL if it can't be fetched."""
+    try:
+        return get_thumbnail_cache().get(url, rendition) or url
+    except Exception:
+        return url
@@ -0,0 +1,484 @@
+"""Shared data access for the ``violations`` collection.
+
+Every page reads violations through the functions below instead of building
+its own Firestore query. Results are cached with ``st.cache_data`` so widget
+touches, Refresh clicks and other sessions reuse the same read until the
+query's TTL runs out. Streamlit holds a per-key lock while a cached function
+computes, so identical requests arriving at the same time from several
+sessions share a single Firestore round trip.
+
+Cached functions take the client as ``_db`` so Streamlit leaves it out of the
+cache key. Queries that take ``camera`` read only that camera's violations
+(matched on ``camera_id``); ``utils/cameras.py`` runs them for several
+cameras at once.
+"""
+import itertools
+import logging
+import math
+from datetime import datetime
+
+import streamlit as st
+from google.api_core.exceptions import FailedPrecondition, MethodNotImplemented
+
+from utils import metrics
+from utils import rollups
+
+COLLECTION = 'violations'
+
+# Cache lifetimes in seconds, per query
+RECENT_TTL = 10       # home page "Recent Violations"
+ACTIVE_TTL = 10       # Live Violations
+TODAY_TTL = 30        # ranges that include today
+ARCHIVE_TTL = 600     # ranges that ended before today
+TIMELINE_TTL = 30     # Plate Lookup
+
+ACTIVE_PAGE_SIZE = 20
+EXPORT_PAGE_SIZE = 1000
+
+# Firestore accepts at most 500 writes per batch
+BATCH_LIMIT = 500
+
+# Fields each query downloads, sent to Firestore as a field mask. Anything
+# else the edge device stores on a violation stays on the server.
+RECENT_FIELDS = ('timestamp', 'vehicle_type', 'plate_number', 'duration', 'location', 'status', 'image_url', 'camera_id')
+LIVE_FIELDS = ('timestamp', 'vehicle_type', 'plate_number', 'color', 'duration', 'location', 'image_url', 'camera_id')
+TABLE_FIELDS = ('timestamp', 'camera_id', 'vehicle_type', 'plate_number', 'duration', 'status')
+ROLLUP_FIELDS = ('timestamp', 'status', 'vehicle_type', 'duration', 'camera_id')
+TIMELINE_FIELDS = ('timestamp', 'plate_number', 'vehicle_type', 'color', 'location', 'duration', 'status')
+
+# Firestore's limit on values in an 'in' filter
+IN_LIMIT = 30
+
+# Raised where an aggregation query can't run: no index for it, or a backend
+# (such as an older emulator) without aggregations
+AGGREGATION_ERRORS = (FailedPrecondition, MethodNotImplemented)
+
+logger = logging.getLogger(__name__)
+
+
+def _violations(db, camera=None):
+    query = db.collection(COLLECTION)
+    if camera is not None:
+        query = query.where('camera_id', '==', camera)
+    return query
+
+
+def _stream(label, query):
+    """Stream ``query`` as plain dicts carrying their document id, recorded under ``label``."""
+    with metrics.track(label) as recorder:
+        for doc in query.stream():
+            data = doc.to_dict()
+            data['id'] = doc.id
+            recorder.add(data)
+            yield data
+        if not recorder.docs:
+            # An empty result is still billed as one read
+            recorder.reads(1)
+
+
+def _aggregate(label, aggregate_query):
+    with metrics.track(label) as recorder:
+        results = {result.alias: result.value for result in aggregate_query.get()[0]}
+        # Billed at one read per 1000 index entries counted
+        counted = max((value for value in results.values() if isinstance(value, int)), default=0)
+        recorder.reads(max(1, math.ceil(counted / 1000)))
+    return results
+
+
+def _try_aggregate(label, build):
+    """``_aggregate`` of the query ``build()`` returns; None, logged, where aggregations aren't available."""
+    try:
+        aggregate_query = build()
+    except AttributeError as e:
+        # A client library from before aggregation queries
+        error = e
+    else:
+        try:
+            return _aggregate(label, aggregate_query)
+        except AGGREGATION_ERRORS as e:
+            error = e
+    logger.warning("%s: aggregation query unavailable (%s), falling back", label, error)
+    return None
+
+
+@st.cache_data(ttl=RECENT_TTL, show_spinner=False)
+def get_recent_violations(_db, limit=3, camera=None):
+    from firebase_admin import firestore
+
+    query = (
+        _violations(_db, camera)
+        .select(RECENT_FIELDS)
+        .order_by('timestamp', direction=firestore.Query.DESCENDING)
+        .limit(limit)
+    )
+    return list(_stream('recent violations', query))
+
+
+@st.cache_data(ttl=ACTIVE_TTL, show_spinner=False)
+def get_active_violations_page(_db, page_size=ACTIVE_PAGE_SIZE, cursor=None, camera=None):
+    """One page of active violations, newest first.
+
+    Filtering and ordering run server-side on the ``status, timestamp`` index
+    (``camera_id, status, timestamp`` for one camera; see
+    ``firestore.indexes.json``), so cost follows the number of active
+    violations rather than the size of the archive. ``cursor`` is the
+    ``next_cursor`` returned for the previous page. Returns
+    ``(violations, next_cursor)``; ``next_cursor`` is None on the last page.
+    """
+    from firebase_admin import firestore
+
+    query = (
+        _violations(_db, camera)
+        .where('status', '==', 'active')
+        .select(LIVE_FIELDS)
+        .order_by('timestamp', direction=firestore.Query.DESCENDING)
+        .order_by('__name__', direction=firestore.Query.DESCENDING)
+    )
+    if cursor is not None:
+        timestamp, doc_id = cursor
+        query = query.start_after({'timestamp': timestamp, '__name__': doc_id})
+    # One extra row tells us whether another page exists
+    violations = list(_stream('active violations page', query.limit(page_size + 1)))
+    next_cursor = None
+    if len(violations) > page_size:
+        violations = violations[:page_size]
+        last = violations[-1]
+        next_cursor = (last['timestamp'], last['id'])
+    return violations, next_cursor
+
+
+def get_active_violations_window(db, start, count, camera=None):
+    """Active violations ``start`` to ``start + count``, newest first.
+
+    Built from the cached cursor pages above, so moving the window around
+    only reads pages that haven't been fetched within ``ACTIVE_TTL``.
+    """
+    violations = []
+    cursor = None
+    while len(violations) < start + count:
+        page, cursor = get_active_violations_page(db, cursor=cursor, camera=camera)
+        violations.extend(page)
+        if cursor is None:
+            break
+    return violations[start:start + count]
+
+
+@st.cache_data(ttl=ACTIVE_TTL, show_spinner=False)
+def count_active_violations(_db, camera=None):
+    """Number of active violations from a count aggregation (no documents downloaded)."""
+    query = _violations(_db, camera).where('status', '==', 'active')
+    counted = _try_aggregate('active count', lambda: query.count(alias='active'))
+    if counted is not None:
+        return counted['active']
+    # No aggregation support: fetch document names only
+    return sum(1 for _ in _stream('active count (documents)', query.select([])))
+
+
+@st.cache_data(ttl=TODAY_TTL, show_spinner=False)
+def _violations_between_live(_db, start_time, end_time, fields, camera=None):
+    return list(stream_violations_between(_db, start_time, end_time, fields, camera))
+
+
+@st.cache_data(ttl=ARCHIVE_TTL, show_spinner=False)
+def _violations_between_archive(_db, start_time, end_time, fields, camera=None):
+    return list(stream_violations_between(_db, start_time, end_time, fields, camera))
+
+
+@st.cache_data(ttl=TIMELINE_TTL, show_spinner=False)
+def get_plate_timeline(_db, plates):
+    """Every violation of the given plate numbers (up to ``IN_LIMIT``), newest first.
+
+    Served by the ``plate_number, timestamp`` index in ``firestore.indexes.json``,
+    so it reads only those plates' violations.
+    """
+    from firebase_admin import firestore
+
+    query = (
+        _db.collection(COLLECTION)
+        .where('plate_number', 'in', list(plates)[:IN_LIMIT])
+        .select(TIMELINE_FIELDS)
+        .order_by('timestamp', direction=firestore.Query.DESCENDING)
+    )
+    return list(_stream('plate timeline', query))
+
+
+def stream_violations_between(db, start_time, end_time=None, fields=None, camera=None):
+    """Uncached generator over a time range, for jobs that read it once.
+
+    ``fields`` limits each document to those fields; None downloads everything.
+    """
+    query = _violations(db, camera).where('timestamp', '>=', start_time)
+    if end_time is not None:
+        query = query.where('timestamp', '<=', end_time)
+    if fields is not None:
+        query = query.select(fields)
+    yield from _stream('violations between', query)
+
+
+def page_violations_between(db, start_time, end_time=None, fields=None, camera=None, page_size=EXPORT_PAGE_SIZE):
+    """Uncached generator over a time range, oldest first, read ``page_size`` documents at a time.
+
+    Each page is a separate query that starts after the previous page's last
+    document, so only one page is held in memory and a long read never keeps
+    a single stream open.
+    """
+    query = _violations(db, camera).where('timestamp', '>=', start_time)
+    if end_time is not None:
+        query = query.where('timestamp', '<=', end_time)
+    query = query.order_by('timestamp').order_by('__name__')
+    if fields is not None:
+        query = query.select(fields)
+    cursor = None
+    while True:
+        page = query if cursor is None else query.start_after(cursor)
+        violations = list(_stream('violations page', page.limit(page_size)))
+        yield from violations
+        if len(violations) < page_size:
+            return
+        cursor = {'timestamp': violations[-1]['timestamp'], '__name__': violations[-1]['id']}
+
+
+def count_violations_between(db, start_time, end_time, camera=None):
+    """Number of violations in a time range from a count aggregation; None without aggregation support."""
+    query = _violations(db, camera).where('timestamp', '>=', start_time).where('timestamp', '<=', end_time)
+    counted = _try_aggregate('range count', lambda: query.count(alias='total'))
+    return None if counted is None else counted['total']
+
+
+@st.cache_data(ttl=TODAY_TTL, show_spinner=False)
+def count_day_violations(_db, day, camera=None):
+    """Number of violations recorded on ``day`` from a count aggregation (no documents downloaded)."""
+    start_time = datetime.combine(day, datetime.min.time())
+    end_time = datetime.combine(day, datetime.max.time())
+    counted = count_violations_between(_db, start_time, end_time, camera)
+    if counted is not None:
+        return counted
+    # No aggregation support: fetch document names only
+    query = _violations(_db, camera).where('timestamp', '>=', start_time).where('timestamp', '<=', end_time)
+    return sum(1 for _ in _stream('range count (documents)', query.select([])))
+
+
+def stream_violations_after(db, field, after, fields=None):
+    """Uncached generator over violations whose ``field`` is later than ``after``.
+
+    Used for incremental syncs on ``timestamp`` or ``resolved_at``; both are
+    covered by Firestore's automatic single-field indexes.
+    """
+    query = db.collection(COLLECTION).where(field, '>', after)
+    if fields is not None:
+        query = query.select(fields)
+    yield from _stream(f'violations after {field}', query)
+
+
+def get_violations_between(db, start_time, end_time=None, fields=None, camera=None):
+    """Violations with ``start_time <= timestamp <= end_time``.
+
+    Pass one of the ``*_FIELDS`` tuples as ``fields`` to download only what
+    the caller renders. Ranges that finished before today change rarely (only
+    when an old violation is resolved), so they are kept much longer than
+    ranges that are still filling up.
+    """
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    if end_time is not None and end_time < today:
+        return _violations_between_archive(db, start_time, end_time, fields, camera)
+    return _violations_between_live(db, start_time, end_time, fields, camera)
+
+
+@st.cache_data(ttl=TODAY_TTL, show_spinner=False)
+def _daily_rollups_live(_db, start_date, end_date):
+    return _load_daily_rollups(_db, start_date, end_date)
+
+
+@st.cache_data(ttl=ARCHIVE_TTL, show_spinner=False)
+def _daily_rollups_archive(_db, start_date, end_date):
+    return _load_daily_rollups(_db, start_date, end_date)
+
+
+def _load_daily_rollups(db, start_date, end_date):
+    query = (
+        db.collection(rollups.ROLLUP_COLLECTION)
+        .where('date', '>=', rollups.day_key(start_date))
+        .where('date', '<=', rollups.day_key(end_date))
+    )
+    # Snapshots rather than dicts: storing a rebuilt day is conditioned on them
+    with metrics.track('daily rollups') as recorder:
+        snapshots = {}
+        for snapshot in query.stream():
+            snapshots[snapshot.id] = snapshot
+            recorder.add(snapshot.to_dict())
+        if not snapshots:
+            recorder.reads(1)
+    docs = {key: snapshot.to_dict() for key, snapshot in snapshots.items()}
+    days = rollups.date_range(start_date, end_date)
+    missing = [day for day in days if not rollups.is_complete(docs.get(rollups.day_key(day)))]
+    # Runs of consecutive days, so complete days in between aren't read again
+    runs = [
+        [day for _, day in run]
+        for _, run in itertools.groupby(enumerate(missing), key=lambda item: item[1].toordinal() - item[0])
+    ]
+    for run in runs:
+        # Not rolled up, or only partly (see rollups.is_complete): count these
+        # days from the raw documents and store them, today included
+        start_time = datetime.combine(run[0], datetime.min.time())
+        end_time = datetime.combine(run[-1], datetime.max.time())
+        built = rollups.build_days(stream_violations_between(db, start_time, end_time, ROLLUP_FIELDS), run)
+        rollups.store_rebuilt(db, built, snapshots)
+        docs.update(built)
+    return [docs[rollups.day_key(day)] for day in days]
+
+
+def get_daily_rollups(db, start_date, end_date):
+    """Rollup documents for each day from ``start_date`` to ``end_date``, in order."""
+    if end_date < rollups.today():
+        return _daily_rollups_archive(db, start_date, end_date)
+    return _daily_rollups_live(db, start_date, end_date)
+
+
+def _aggregate_summary(db, start_time, end_time):
+    """Day summary from server-side count/sum aggregations (a few reads per 1000 documents); None without them."""
+    query = db.collection(COLLECTION).where('timestamp', '>=', start_time).where('timestamp', '<=', end_time)
+    totals = _try_aggregate('day summary', lambda: query.count(alias='total'))
+    if totals is None:
+        return None
+    # Durations count once a violation is resolved, as in the rollups
+    resolved = _try_aggregate(
+        'day summary',
+        lambda: query.where('status', '==', 'resolved').count(alias='resolved').avg('duration', alias='avg_duration'),
+    )
+    if resolved is None:
+        return None
+    total = totals['total']
+    return {
+        'total': total,
+        'active': total - resolved['resolved'],
+        'resolved': resolved['resolved'],
+        'avg_duration': resolved['avg_duration'] or 0,
+    }
+
+
+@st.cache_data(ttl=TODAY_TTL, show_spinner=False)
+def get_day_summary(_db, day):
+    """Total/active/resolved/avg duration for one day.
+
+    Read from the day's rollup when it is complete (see
+    ``rollups.is_complete``). Otherwise Firestore aggregation queries do the
+    counting, and if those aren't available (the
+    emulator, an older client library, a missing index) the day's documents
+    are counted here instead.
+    """
+    with metrics.track('day rollup') as recorder:
+        rollup = rollups.rollup_ref(_db, day).get()
+        if rollup.exists:
+            recorder.add(rollup.to_dict())
+        else:
+            recorder.reads(1)
+    if rollup.exists and rollups.is_complete(rollup.to_dict()):
+        return rollups.summary(rollup.to_dict())
+    start_time = datetime.combine(day, datetime.min.time())
+    end_time = datetime.combine(day, datetime.max.time())
+    aggregated = _aggregate_summary(_db, start_time, end_time)
+    if aggregated is not None:
+        return aggregated
+    built = rollups.build_days(stream_violations_between(_db, start_time, end_time, ROLLUP_FIELDS), [day])
+    return rollups.summary(built[rollups.day_key(day)])
+
+
+def _resolve(transaction, db, violation_id):
+    ref = db.collection(COLLECTION).document(violation_id)
+    snapshot = ref.get(transaction=transaction)
+    violation = snapshot.to_dict() if snapshot.exists else None
+    if not violation or violation.get('status') != 'active':
+        return False
+    # Only adjust rollups that exist; missing days are built from raw data later
+    rollup = rollups.rollup_ref(db, violation['timestamp']) if violation.get('timestamp') else None
+    rollup_exists = rollup is not None and rollup.get(transaction=transaction).exists
+    transaction.update(ref, {
+        'status': 'resolved',
+        'resolved_at': datetime.now()
+    })
+    if rollup_exists:
+        transaction.set(rollup, rollups.resolve_updates([violation]), merge=True)
+    return True
+
+
+def _resolve_transaction(db, violation_id):
+    from firebase_admin import firestore
+
+    # Retried on contention like any @firestore.transactional function
+    return firestore.transactional(_resolve)(db.transaction(), db, violation_id)
+
+
+def resolve_violation(db, violation_id):
+    """Mark an active violation resolved and move it between rollup counters."""
+    with metrics.track('resolve violation') as recorder:
+        resolved = _resolve_transaction(db, violation_id)
+        # The violation and its day's rollup
+        recorder.reads(2)
+    clear_cache()
+    return resolved
+
+
+def resolve_violations(db, violation_ids):
+    """Resolve many violations with batched writes; returns the ids that were resolved.
+
+    Each batch holds the updates for whole days plus one rollup update per
+    day, so documents and counters change together. Every update is
+    conditioned on the document's last update time. If another session
+    changed one of them in the meantime, that batch is redone one violation
+    at a time through the transactional path.
+    """
+    refs = [db.collection(COLLECTION).document(violation_id) for violation_id in violation_ids]
+    by_day = {}
+    with metrics.track('bulk resolve lookup') as recorder:
+        for start in range(0, len(refs), BATCH_LIMIT):
+            for snapshot in db.get_all(refs[start:start + BATCH_LIMIT]):
+                recorder.reads(1)
+                violation = snapshot.to_dict() if snapshot.exists else None
+                if violation and violation.get('status') == 'active':
+                    key = rollups.day_key(violation['timestamp']) if violation.get('timestamp') else None
+                    by_day.setdefault(key, []).append(snapshot)
+
+        rollup_refs = [db.collection(rollups.ROLLUP_COLLECTION).document(key) for key in by_day if key]
+        existing = {snapshot.id for snapshot in db.get_all(rollup_refs) if snapshot.exists} if rollup_refs else set()
+        recorder.reads(len(rollup_refs))
+
+    resolved = []
+    now = datetime.now()
+    batch, writes, pending = db.batch(), 0, []
+    for key, snapshots in by_day.items():
+        has_rollup = key in existing
+        for start in range(0, len(snapshots), BATCH_LIMIT - 1):
+            piece = snapshots[start:start + BATCH_LIMIT - 1]
+            needed = len(piece) + has_rollup
+            if writes + needed > BATCH_LIMIT:
+                resolved += _commit_resolves(db, batch, pending)
+                batch, writes, pending = db.batch(), 0, []
+            for snapshot in piece:
+                batch.update(snapshot.reference, {'status': 'resolved', 'resolved_at': now},
+                             option=db.write_option(last_update_time=snapshot.update_time))
+            if has_rollup:
+                batch.set(db.collection(rollups.ROLLUP_COLLECTION).document(key),
+                          rollups.resolve_updates([snapshot.to_dict() for snapshot in piece]), merge=True)
+            writes += needed
+            pending += piece
+    if pending:
+        resolved += _commit_resolves(db, batch, pending)
+    clear_cache()
+    return resolved
+
+
+def _commit_resolves(db, batch, snapshots):
+    try:
+        with metrics.track('bulk resolve commit'):
+            batch.commit()
+        return [snapshot.id for snapshot in snapshots]
+    except FailedPrecondition:
+        return [snapshot.id for snapshot in snapshots if _resolve_transaction(db, snapshot.id)]
+
+
+def clear_cache():
+    """Drop every cached violations query, e.g. after a write or a manual refresh."""
+    for func in (get_recent_violations, get_active_violations_page, count_active_violations, count_day_violations,
+                 _violations_between_live, _violations_between_archive, get_plate_timeline,
+                 _daily_rollups_live, _daily_rollups_archive, get_day_summary):
+        func.clear()